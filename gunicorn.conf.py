@@ -0,0 +1,38 @@
+# Production server: gunicorn managing several uvicorn worker processes.
+# Start with `gunicorn -c gunicorn.conf.py main:app`. Send HUP to the master
+# to reload code with a graceful restart of every worker.
+import os
+import shutil
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Workers finish in-flight requests for this long on restart or shutdown.
+# Verification jobs that are cut off are requeued by another worker.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Streamed verifications hold a request open, so allow long silences
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Recycle workers now and then to bound memory growth; 0 disables
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "50"))
+
+# main.py reads these when each worker imports it
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if workers > 1:
+    # Rotating one file from several processes is unsafe; log to the console
+    os.environ.setdefault("LOG_FILE", "")
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(os.getcwd(), ".prometheus"))
+
+def on_starting(server):
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        # Start each run with fresh per-worker metric files
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,30 +1,248 @@
 from fastapi import FastAPI, Form, UploadFile, File, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from starlette.datastructures import Headers
+from pydantic import BaseModel
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import List
+from enum import Enum
+import httpx
+import asyncio
 import os
+import time
 import logging
 import json
+import hmac
+import hashlib
+import base64
+import re
+import shutil
+import tempfile
+import sqlite3
+import uuid
+import csv
+import io
+import random
+import email.utils
+import contextvars
+import heapq
+import threading
+import logging.handlers
+import queue
+import atexit
 from dotenv import load_dotenv
 from urllib.parse import quote
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+from prometheus_client import Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client import CollectorRegistry, multiprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Trace ID of the request being handled, added to every log line
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+# Configure logging. Records are put on a queue by the request path and
+# written to the console and a rotating file by a background thread, so a
+# slow disk never blocks the event loop. Long messages are truncated.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Rotate on a schedule (e.g. "midnight", "H") instead of by size
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_JSON = os.getenv("LOG_JSON", "true").lower() == "true"
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "1000"))
+LOG_TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(trace_id)s - %(message)s'
+
+class TruncateFilter(logging.Filter):
+    """
+    Cut messages longer than LOG_MAX_MESSAGE_CHARS, noting how much was dropped
+    """
+    def filter(self, record):
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            record.msg = f"{message[:LOG_MAX_MESSAGE_CHARS]}... [{len(message) - LOG_MAX_MESSAGE_CHARS} chars truncated]"
+            record.args = None
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with time, level, logger, trace ID and message
+    """
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            # QueueHandler has already folded any traceback into the message
+            "message": record.getMessage(),
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging():
+    handlers = []
+    if not LOG_FILE:
+        # Console only; used when several worker processes would share one file
+        file_handler = None
+    elif LOG_ROTATE_WHEN:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    if file_handler is not None:
+        file_handler.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(LOG_TEXT_FORMAT))
+        handlers.append(file_handler)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_TEXT_FORMAT))
+    handlers.append(console_handler)
+
+    # The trace ID is read where the record is created, before it changes threads
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(TraceIdFilter())
+    queue_handler.addFilter(TruncateFilter())
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics. Stage timings are histograms; the stats dicts kept by
+# the caches and the outbound client are exported by StatsCollector when
+# /metrics is scraped, so they cost nothing on the request path.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+STAGE_SECONDS = Histogram(
+    "verification_stage_seconds", "Time spent in each verification stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+VERIFICATION_ERRORS = Counter("verification_errors", "Failed verifications by stage", ["stage"])
+OPENAI_TOKENS = Counter("openai_tokens", "Tokens used by OpenAI calls", ["model", "kind"])
+OPENAI_QUEUE_WAIT = Histogram(
+    "openai_queue_wait_seconds", "Time OpenAI requests waited for rate limit capacity", ["scheduler"],
+    buckets=LATENCY_BUCKETS
+)
+OPENAI_THROTTLED = Counter("openai_throttled", "OpenAI requests held back by the rate limit scheduler", ["scheduler"])
+OUTBOUND_SECONDS = Histogram(
+    "outbound_request_seconds", "Outbound request time including retries", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+
+@contextmanager
+def observe_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+def record_token_usage(model, usage):
+    """
+    Count the prompt and completion tokens of an OpenAI `usage` object
+    """
+    if not usage:
+        return
+    OPENAI_TOKENS.labels(model, "prompt").inc(usage.get("prompt_tokens") or 0)
+    OPENAI_TOKENS.labels(model, "completion").inc(usage.get("completion_tokens") or 0)
+
+class StatsCollector:
+    """
+    Export the in-process stats dicts as Prometheus counters at scrape time
+    """
+    def describe(self):
+        return []
+
+    def collect(self):
+        lookups = CounterMetricFamily("cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        for cache, stats in [
+            ("shopify_order", shopify_order_cache.stats),
+            ("transcript", TRANSCRIPT_CACHE_STATS),
+            ("result", RESULT_CACHE_STATS),
+        ]:
+            lookups.add_metric([cache, "hit"], stats["hits"])
+            lookups.add_metric([cache, "miss"], stats["misses"])
+        lookups.add_metric(["result", "bypass"], RESULT_CACHE_STATS["bypassed"])
+        yield lookups
+
+        for name in ["attempts", "retries", "failures", "timeouts", "rejected", "hedges"]:
+            family = CounterMetricFamily(f"outbound_{name}", f"Outbound request {name} by endpoint", labels=["endpoint"])
+            for endpoint, stats in OUTBOUND_STATS.items():
+                family.add_metric([endpoint], stats[name])
+            yield family
+
+        pre_verify = CounterMetricFamily("preverify_attributes", "Attributes checked by the pre-verifier", labels=["resolved"])
+        pre_verify.add_metric(["local"], PRE_VERIFY_STATS["attributes_local"])
+        pre_verify.add_metric(["model"], PRE_VERIFY_STATS["attributes_total"] - PRE_VERIFY_STATS["attributes_local"])
+        yield pre_verify
+        yield CounterMetricFamily("verification_repairs", "Repair requests for malformed results", value=PARSE_STATS["repairs"])
+
+REGISTRY.register(StatsCollector())
+
+# Shared outbound HTTP client. A single connection pool is kept for the whole
+# process lifetime so keep-alive and TLS sessions to api.openai.com and the
+# Shopify endpoint are reused across requests.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "300"))
+
+http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared async HTTP client, creating it on first use
+    """
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            # Individual calls set their own timeouts where needed
+            timeout=httpx.Timeout(None),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if THREAD_POOL_SIZE:
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE))
+    get_http_client()
+    logger.info("Shared HTTP client started")
+    thread_gc_task = asyncio.create_task(collect_assistant_threads())
+    await asyncio.to_thread(init_jobs_db)
+    await asyncio.to_thread(init_result_cache)
+    job_workers = [asyncio.create_task(job_worker(i)) for i in range(JOB_WORKERS)]
+    logger.info(f"Started {JOB_WORKERS} verification job workers")
+    yield
+    background_tasks = [thread_gc_task, *job_workers]
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if http_client is not None:
+        await http_client.aclose()
+        logger.info("Shared HTTP client closed")
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -36,71 +254,1214 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# API endpoints
-GPT_ENDPOINT = "https://api.openai.com/v1/chat/completions"
-ASSISTANTS_ENDPOINT = "https://api.openai.com/v1/assistants"
-THREADS_ENDPOINT = "https://api.openai.com/v1/threads"
-MESSAGES_ENDPOINT = "https://api.openai.com/v1/threads/{thread_id}/messages"
-RUNS_ENDPOINT = "https://api.openai.com/v1/threads/{thread_id}/runs"
-WHISPER_ENDPOINT = "https://api.openai.com/v1/audio/transcriptions"  # OpenAI Whisper API
+class UploadTooLarge(HTTPException):
+    """
+    Raised while a request body is still arriving once it exceeds the upload limit
+    """
+    def __init__(self, max_mb):
+        super().__init__(status_code=413, detail=f"Audio file too large. Audio uploads are limited to {max_mb:g} MB.")
+
+class UploadSizeLimitMiddleware:
+    """
+    Enforce the upload size limit on form posts while the body is being received,
+    instead of after the whole file has been buffered
+    """
+    def __init__(self, app, paths, max_mb, overhead_mb=1):
+        self.app = app
+        self.paths = set(paths)
+        self.max_mb = max_mb
+        # Leave room for the text fields and multipart framing around the audio
+        self.max_bytes = int((max_mb + overhead_mb) * 1024 * 1024)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = Headers(scope=scope).get("content-length", "")
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            # Raised from inside body parsing so the route's exception handlers render it
+            if content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise UploadTooLarge(self.max_mb)
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_mb)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+LOG_TRACE_IDS = os.getenv("LOG_TRACE_IDS", "true").lower() == "true"
+TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+class TraceIdMiddleware:
+    """
+    Give each request a trace ID (the caller's X-Request-ID when valid) that
+    is added to every log line written while handling it and sent back in
+    the X-Request-ID response header
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = Headers(scope=scope).get("x-request-id", "")
+        if not TRACE_ID_RE.match(trace_id):
+            trace_id = uuid.uuid4().hex[:16]
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", trace_id.encode())]
+            await send(message)
+
+        token = trace_id_var.set(trace_id)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            trace_id_var.reset(token)
+
+
+# State that worker processes must agree on: the Shopify order cache, recent
+# order webhooks and the OpenAI back-off. A single process keeps it in memory;
+# under gunicorn with several workers (WEB_CONCURRENCY > 1) it lives in a
+# SQLite database in WAL mode that all workers on the host share. Jobs,
+# verification results and transcripts are already stored in SQLite or on disk.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite" if WEB_CONCURRENCY > 1 else "memory")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+# Longest a write waits for another worker's lock before giving up
+STATE_DB_BUSY_TIMEOUT = float(os.getenv("STATE_DB_BUSY_TIMEOUT", "0.5"))  # seconds
+# Threads per worker process for blocking work (SQLite, file I/O); 0 keeps asyncio's default
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "0"))
+
+class MemoryStateStore:
+    """
+    Named numbers kept in this process
+    """
+    def __init__(self):
+        self._numbers = {}
+
+    def get(self, name, default=0.0):
+        return self._numbers.get(name, default)
+
+    def discard_below(self, prefix, value):
+        """
+        Remove the numbers whose names start with `prefix` and that are lower than `value`
+        """
+        for name in [name for name, number in self._numbers.items() if name.startswith(prefix) and number < value]:
+            del self._numbers[name]
+
+    def raise_to(self, name, value):
+        """
+        Set `name` to `value` unless it is already higher
+        """
+        self._numbers[name] = max(self._numbers.get(name, value), value)
+
+class SQLiteStateStore:
+    """
+    Named numbers, and the tables behind SQLiteTTLCache, in a database shared
+    by every worker process. Statements are single indexed lookups, so they
+    run inline on the event loop rather than in a thread. In WAL mode reads
+    never wait for a writer, and writes wait at most STATE_DB_BUSY_TIMEOUT.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def execute(self, sql, parameters=(), wait=True):
+        """
+        Run one statement; with wait=False a locked database fails at once
+        instead of waiting up to STATE_DB_BUSY_TIMEOUT
+        """
+        with self._lock:
+            # Connections are not carried across fork; each worker opens its own
+            if self._connection is None or self._pid != os.getpid():
+                self._connection = sqlite3.connect(self.path, timeout=STATE_DB_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+                self._connection.execute("CREATE TABLE IF NOT EXISTS numbers (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+                self._connection.execute("""
+                    CREATE TABLE IF NOT EXISTS cache (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires REAL NOT NULL,
+                        last_used REAL NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    )
+                """)
+                self._pid = os.getpid()
+            if wait:
+                return self._connection.execute(sql, parameters)
+            self._connection.execute("PRAGMA busy_timeout = 0")
+            try:
+                return self._connection.execute(sql, parameters)
+            finally:
+                self._connection.execute(f"PRAGMA busy_timeout = {int(STATE_DB_BUSY_TIMEOUT * 1000)}")
+
+    def get(self, name, default=0.0):
+        row = self.execute("SELECT value FROM numbers WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def discard_below(self, prefix, value):
+        """
+        Remove the numbers whose names start with `prefix` and that are lower than `value`
+        """
+        self.execute("DELETE FROM numbers WHERE substr(name, 1, ?) = ? AND value < ?", (len(prefix), prefix, value))
+
+    def raise_to(self, name, value):
+        """
+        Set `name` to `value` unless it is already higher
+        """
+        self.execute(
+            "INSERT INTO numbers (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+            (name, value)
+        )
+
+state_store = SQLiteStateStore(STATE_DB_PATH) if STATE_BACKEND == "sqlite" else MemoryStateStore()
+
+# The shared OpenAI back-off is checked before every OpenAI request, so this
+# process re-reads it from the state store at most once a second
+OPENAI_COOLDOWN_REFRESH = 1.0  # seconds
+openai_cooldown = {"until": 0.0, "checked": float("-inf")}
+
+def openai_cooldown_until():
+    """
+    Wall-clock time until which OpenAI has asked every worker to back off
+    """
+    now = time.monotonic()
+    if now - openai_cooldown["checked"] >= OPENAI_COOLDOWN_REFRESH:
+        openai_cooldown["checked"] = now
+        try:
+            openai_cooldown["until"] = max(openai_cooldown["until"], state_store.get("openai_cooldown_until"))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read the shared OpenAI back-off: {str(e)}")
+    return openai_cooldown["until"]
+
+def note_openai_rate_limit(response):
+    """
+    Record the Retry-After of a 429 response from OpenAI; batch work in every
+    worker waits until then
+    """
+    if response.status_code != 429:
+        return
+    try:
+        retry_after = float(response.headers.get("retry-after", "1"))
+    except ValueError:
+        retry_after = 1.0
+    until = time.time() + retry_after
+    openai_cooldown["until"] = max(openai_cooldown["until"], until)
+    try:
+        state_store.raise_to("openai_cooldown_until", until)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not share the OpenAI back-off with other workers: {str(e)}")
+    logger.warning(f"OpenAI rate limit hit, backing off for {retry_after:g} seconds")
+
+# OpenAI requests are admitted by a scheduler that keeps them under the
+# account's requests-per-minute and tokens-per-minute limits, so bursts of
+# verifications queue here instead of failing with 429s. Tokens are counted
+# the way OpenAI counts them when a request arrives: prompt characters / 4
+# plus the completion allowance. With several worker processes each gets an
+# equal share of the limits, and all of them follow the remaining-capacity
+# headers OpenAI returns.
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "30000"))
+WHISPER_RPM_LIMIT = float(os.getenv("WHISPER_RPM_LIMIT", "50"))
+# Completion tokens counted for a request that does not set max_tokens
+OPENAI_COMPLETION_ESTIMATE = int(os.getenv("OPENAI_COMPLETION_ESTIMATE", "500"))
+# A request that has waited this long for capacity fails instead
+OPENAI_QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "120"))  # seconds
+
+# Waiting requests with a lower number go first; batch work yields to people
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+openai_priority_var = contextvars.ContextVar("openai_priority", default=PRIORITY_INTERACTIVE)
+
+class RateLimitQueueTimeout(Exception):
+    """
+    Raised when a request waited longer than OPENAI_QUEUE_TIMEOUT for rate limit capacity
+    """
+
+class RateLimitScheduler:
+    """
+    Request and token buckets that refill continuously up to one minute's
+    limit. Requests that do not fit wait and are admitted in priority order,
+    oldest first, as capacity returns or once an OpenAI Retry-After has passed.
+    """
+    def __init__(self, name, requests_per_minute, tokens_per_minute=0):
+        self.name = name
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.requests = requests_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+        self.waiters = []  # heap of (priority, sequence, tokens, future)
+        self.sequence = 0
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+        self.stats = {"admitted": 0, "throttled": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def seconds_until_fits(self, tokens):
+        """
+        Seconds until a request of `tokens` can be admitted, 0 if it can be now
+        """
+        delay = max(0.0, openai_cooldown_until() - time.time())
+        if self.requests < 1:
+            delay = max(delay, (1 - self.requests) * 60 / self.rpm)
+        if self.tpm and self.tokens < tokens:
+            delay = max(delay, (tokens - self.tokens) * 60 / self.tpm)
+        return delay
+
+    def take(self, tokens):
+        self.requests -= 1
+        self.tokens -= tokens
+        self.stats["admitted"] += 1
+
+    async def acquire(self, tokens=0):
+        """
+        Wait until a request of `tokens` estimated tokens fits under the limits
+        """
+        # A request larger than a whole minute's budget is let through once the bucket is full
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        self.refill()
+        if not self.waiters and self.seconds_until_fits(tokens) == 0:
+            self.take(tokens)
+            return
+
+        self.stats["throttled"] += 1
+        OPENAI_THROTTLED.labels(self.name).inc()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (openai_priority_var.get(), self.sequence, tokens, future))
+        self.sequence += 1
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        self.wakeup.set()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, OPENAI_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise RateLimitQueueTimeout(
+                f"Waited {OPENAI_QUEUE_TIMEOUT:g} seconds for OpenAI rate limit capacity"
+            )
+        finally:
+            waited = time.perf_counter() - start
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            OPENAI_QUEUE_WAIT.labels(self.name).observe(waited)
+
+    async def dispatch(self):
+        """
+        Admit waiting requests as capacity allows until none are left
+        """
+        while self.waiters:
+            priority, sequence, tokens, future = self.waiters[0]
+            if future.done():
+                # Timed out or cancelled while waiting
+                heapq.heappop(self.waiters)
+                continue
+            self.refill()
+            delay = self.seconds_until_fits(tokens)
+            if delay == 0:
+                heapq.heappop(self.waiters)
+                self.take(tokens)
+                future.set_result(None)
+                continue
+            # A newly queued request may outrank the one at the head
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def observe(self, response):
+        """
+        Lower the buckets to what OpenAI reports as remaining, which also
+        accounts for other workers and other users of the same key
+        """
+        self.refill()
+        try:
+            remaining_requests = response.headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None:
+                self.requests = min(self.requests, float(remaining_requests))
+            remaining_tokens = response.headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None and self.tpm:
+                self.tokens = min(self.tokens, float(remaining_tokens))
+        except ValueError:
+            pass
+
+openai_scheduler = RateLimitScheduler("openai", OPENAI_RPM_LIMIT / WEB_CONCURRENCY, OPENAI_TPM_LIMIT / WEB_CONCURRENCY)
+whisper_scheduler = RateLimitScheduler("whisper", WHISPER_RPM_LIMIT / WEB_CONCURRENCY)
+
+def estimate_openai_tokens(payload):
+    """
+    Tokens OpenAI will count for a request: about four prompt characters per
+    token, a few per message, plus the completion allowance
+    """
+    if not payload:
+        return 0
+    messages = payload.get("messages") or payload.get("thread", {}).get("messages") or []
+    if not messages:
+        return 0
+    characters = sum(len(message["content"]) for message in messages if isinstance(message.get("content"), str))
+    return characters // 4 + 4 * len(messages) + payload.get("max_tokens", OPENAI_COMPLETION_ESTIMATE)
+
+def is_openai_rate_limited(error):
+    if isinstance(error, RateLimitQueueTimeout):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+def raise_for_rate_limit(response):
+    """
+    Raise a 429 that survived retries as httpx.HTTPStatusError, so it is
+    reported as a rate limit rather than a verification result
+    """
+    if response.status_code == 429:
+        response.raise_for_status()
+
+# Outbound calls go through send_request, which applies the endpoint's
+# timeout, retries transient failures with jittered exponential backoff
+# (or the server's Retry-After), fails fast while an endpoint's circuit
+# breaker is open, and records latency and retry counts per endpoint.
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "2"))
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", "0.5"))  # seconds
+OUTBOUND_BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", "8"))  # seconds
+# A Retry-After longer than this is not waited out; the response is returned
+OUTBOUND_RETRY_AFTER_MAX = float(os.getenv("OUTBOUND_RETRY_AFTER_MAX", "30"))  # seconds
+OUTBOUND_LATENCY_SAMPLES = 1000
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Start a second, identical GPT request if the first has not answered after
+# this many seconds and use whichever finishes first. 0 disables hedging.
+GPT_HEDGE_AFTER = float(os.getenv("GPT_HEDGE_AFTER", "0"))
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while an endpoint's circuit breaker is open
+    """
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"{endpoint} is unavailable after repeated failures; retrying in {retry_in:.0f} seconds")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """
+    Open after `failure_threshold` consecutive failures and reject requests
+    until `reset_timeout` has passed, then let a single trial request through
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
 
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))  # seconds without data from OpenAI
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", "600"))
+SHOPIFY_TIMEOUT = float(os.getenv("SHOPIFY_TIMEOUT", "10"))
 
-SHOPIFY_ORDER_ENDPOINT = "https://ziperp-api.vercel.app/api/shopify/"
+# `idempotent` endpoints may be retried after the request was sent; others
+# only when it certainly was not processed (connection failures and 429s).
+# GET and DELETE requests are always safe to repeat.
+OUTBOUND_POLICIES = {
+    "openai_chat": {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=5), "idempotent": True, "scheduler": openai_scheduler
+    },
+    "openai_assistants": {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=5), "idempotent": False, "scheduler": openai_scheduler
+    },
+    "whisper": {"timeout": httpx.Timeout(WHISPER_TIMEOUT, connect=5), "idempotent": True, "scheduler": whisper_scheduler},
+    "shopify": {
+        "timeout": httpx.Timeout(SHOPIFY_TIMEOUT, connect=5),
+        "idempotent": True,
+        "breaker": CircuitBreaker(
+            failure_threshold=int(os.getenv("SHOPIFY_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("SHOPIFY_BREAKER_RESET", "30"))
+        ),
+    },
+}
+
+OUTBOUND_STATS = {
+    endpoint: {
+        "requests": 0, "attempts": 0, "retries": 0, "failures": 0, "timeouts": 0,
+        "rejected": 0, "hedges": 0, "hedge_wins": 0,
+        "latencies": deque(maxlen=OUTBOUND_LATENCY_SAMPLES),
+    }
+    for endpoint in OUTBOUND_POLICIES
+}
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff for the given attempt number
+    """
+    return random.uniform(0, min(OUTBOUND_BACKOFF_MAX, OUTBOUND_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+def retry_after_seconds(response):
+    """
+    Seconds requested by a Retry-After header (delta or HTTP date), or None
+    """
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+async def send_request(endpoint, method, url, stream=False, **kwargs) -> httpx.Response:
+    """
+    Send a request under the endpoint's policy and return the final response.
+    Error responses are returned once retries are exhausted; transport errors
+    are raised. With stream=True the caller must close the response.
+    """
+    policy = OUTBOUND_POLICIES[endpoint]
+    stats = OUTBOUND_STATS[endpoint]
+    breaker = policy.get("breaker")
+    scheduler = policy.get("scheduler")
+    tokens = estimate_openai_tokens(kwargs.get("json")) if scheduler else 0
+    safe_to_repeat = policy["idempotent"] or method in ["GET", "HEAD", "DELETE"]
+    client = get_http_client()
+    stats["requests"] += 1
+    start = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            if breaker and not breaker.allow():
+                stats["rejected"] += 1
+                raise CircuitOpenError(endpoint, breaker.retry_in())
+            if scheduler:
+                await scheduler.acquire(tokens)
+            attempt += 1
+            stats["attempts"] += 1
+            try:
+                request = client.build_request(method, url, timeout=policy["timeout"], **kwargs)
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.TimeoutException):
+                    stats["timeouts"] += 1
+                if breaker:
+                    breaker.record_failure()
+                # A request that never reached the server cannot have been processed
+                retryable = safe_to_repeat or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not retryable or attempt > OUTBOUND_MAX_RETRIES:
+                    stats["failures"] += 1
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"{endpoint} request failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+            else:
+                if breaker:
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if scheduler:
+                    scheduler.observe(response)
+                    note_openai_rate_limit(response)
+                status = response.status_code
+                retryable = status == 429 or (status in RETRYABLE_STATUS_CODES and safe_to_repeat)
+                retry_after = retry_after_seconds(response) if retryable else None
+                if retry_after is not None and retry_after > OUTBOUND_RETRY_AFTER_MAX:
+                    retryable = False
+                if not retryable or attempt > OUTBOUND_MAX_RETRIES:
+                    if status in RETRYABLE_STATUS_CODES:
+                        stats["failures"] += 1
+                    return response
+                # Honour the server's delay, spread out a little so callers do not retry in step
+                delay = retry_after * random.uniform(1, 1.2) if retry_after is not None else backoff_delay(attempt)
+                await response.aclose()
+                logger.warning(f"{endpoint} returned {status}, retry {attempt} in {delay:.2f}s")
+            stats["retries"] += 1
+            await asyncio.sleep(delay)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats["latencies"].append(elapsed)
+        OUTBOUND_SECONDS.labels(endpoint).observe(elapsed)
+
+async def send_hedged_request(endpoint, method, url, hedge_after, stream=False, **kwargs) -> httpx.Response:
+    """
+    Like send_request, but start a duplicate request if the first has not
+    answered within `hedge_after` seconds and return whichever answers first
+    """
+    if hedge_after <= 0:
+        return await send_request(endpoint, method, url, stream=stream, **kwargs)
+    stats = OUTBOUND_STATS[endpoint]
+    scheduler = OUTBOUND_POLICIES[endpoint].get("scheduler")
+    primary = asyncio.create_task(send_request(endpoint, method, url, stream=stream, **kwargs))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+    if scheduler and scheduler.waiters:
+        # Slow because requests are queued for rate limit capacity; a duplicate would only add to the queue
+        return await primary
+
+    stats["hedges"] += 1
+    hedge = asyncio.create_task(send_request(endpoint, method, url, stream=stream, **kwargs))
+    pending = {primary, hedge}
+    winner = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if winner is None and task.exception() is None:
+                    winner = task
+                elif task.exception() is None and stream:
+                    # Both answered at once; release the unused stream
+                    await task.result().aclose()
+    finally:
+        for task in pending:
+            task.cancel()
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if stream and isinstance(result, httpx.Response):
+                await result.aclose()
+    if winner is None:
+        # Both attempts failed; report the original request's error
+        return primary.result()
+    if winner is hedge:
+        stats["hedge_wins"] += 1
+    return winner.result()
+
+def latency_percentiles(samples):
+    if not samples:
+        return {"p50": 0, "p95": 0, "p99": 0}
+    ordered = sorted(samples)
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)}
+
+# API endpoints. The base URLs can be pointed at local stubs for testing.
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+GPT_ENDPOINT = f"{OPENAI_API_BASE}/chat/completions"
+ASSISTANTS_ENDPOINT = f"{OPENAI_API_BASE}/assistants"
+MESSAGES_ENDPOINT = OPENAI_API_BASE + "/threads/{thread_id}/messages"
+RUNS_ENDPOINT = OPENAI_API_BASE + "/threads/{thread_id}/runs"
+THREAD_RUNS_ENDPOINT = f"{OPENAI_API_BASE}/threads/runs"  # Create a thread and run it in one request
+THREAD_ENDPOINT = OPENAI_API_BASE + "/threads/{thread_id}"
+WHISPER_ENDPOINT = f"{OPENAI_API_BASE}/audio/transcriptions"  # OpenAI Whisper API
+WHISPER_MODEL = "whisper-1"
+GPT_MODEL = "gpt-4"
+
+
+SHOPIFY_ORDER_ENDPOINT = os.getenv("SHOPIFY_ORDER_ENDPOINT", "https://ziperp-api.vercel.app/api/shopify/")
 
 # Environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CUSTOM_ASSISTANT_ID = os.getenv("CUSTOM_ASSISTANT_ID")  # Your custom GPT assistant ID
 USE_CUSTOM_GPT = os.getenv("USE_CUSTOM_GPT", "false").lower() == "true"
+SHOPIFY_WEBHOOK_SECRET = os.getenv("SHOPIFY_WEBHOOK_SECRET")
+SHOPIFY_CACHE_TTL = float(os.getenv("SHOPIFY_CACHE_TTL", "300"))  # seconds
+SHOPIFY_CACHE_SIZE = int(os.getenv("SHOPIFY_CACHE_SIZE", "256"))
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", ".transcript_cache")
+TRANSCRIPT_CACHE_MAX_MB = float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "50"))
+# Long recordings are split with ffmpeg and transcribed in parallel chunks.
+# Without ffmpeg, files are uploaded whole and limited to what Whisper accepts.
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+FFPROBE_PATH = os.getenv("FFPROBE_PATH") or shutil.which("ffprobe")
+WHISPER_MAX_UPLOAD_MB = 25
+MAX_AUDIO_UPLOAD_MB = float(os.getenv("MAX_AUDIO_UPLOAD_MB", "200" if FFMPEG_PATH and FFPROBE_PATH else "25"))
+TRANSCRIBE_CHUNK_MIN_MB = float(os.getenv("TRANSCRIBE_CHUNK_MIN_MB", "5"))  # Smaller files are uploaded whole
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", "2"))  # seconds
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
 
 logger.info("Application started")
 logger.info(f"OpenAI API Key configured: {'Yes' if OPENAI_API_KEY else 'No'}")
 logger.info(f"Custom Assistant ID configured: {'Yes' if CUSTOM_ASSISTANT_ID else 'No'}")
 logger.info(f"Use Custom GPT: {USE_CUSTOM_GPT}")
 logger.info(f"Shopify Order Endpoint: {SHOPIFY_ORDER_ENDPOINT}")
+logger.info(f"Shopify Webhook Secret configured: {'Yes' if SHOPIFY_WEBHOOK_SECRET else 'No'}")
+logger.info(f"Chunked transcription available: {'Yes' if FFMPEG_PATH and FFPROBE_PATH else 'No'}")
+
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/submit", "/jobs"], max_mb=MAX_AUDIO_UPLOAD_MB)
+if LOG_TRACE_IDS:
+    app.add_middleware(TraceIdMiddleware)
+templates.env.globals["max_audio_upload_mb"] = f"{MAX_AUDIO_UPLOAD_MB:g}"
 
-def fetch_shopify_order(order_id: str) -> str:
+class TTLCache:
     """
-    Fetch order details from your Shopify endpoint
+    Bounded in-process cache with per-entry TTL and LRU eviction
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key):
+        return self._entries.pop(key, None) is not None
+
+    def keys(self):
+        return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteTTLCache:
+    """
+    TTLCache kept in the shared state database, so all worker processes see
+    the same entries. Values must be JSON-serializable. Hits only write when
+    an entry's last use is older than `touch_interval`, so most are pure
+    reads, and a failed write only costs a cache entry.
+    """
+    def __init__(self, store, namespace, maxsize, ttl):
+        self.store = store
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Eviction order only needs to be roughly least recently used
+        self.touch_interval = min(60.0, ttl / 10)
+        # Counted per process
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        now = time.time()
+        row = self.store.execute(
+            "SELECT value, expires, last_used FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        value, expires, last_used = row
+        if expires <= now:
+            # Expired rows are skipped by every read; removing them can wait for the next put
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        if now - last_used >= self.touch_interval:
+            try:
+                self.store.execute(
+                    "UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?", (now, self.namespace, key),
+                    wait=False
+                )
+            except sqlite3.OperationalError:
+                pass  # Another worker holds the lock; the entry is touched on a later hit
+        self.stats["hits"] += 1
+        return json.loads(value)
+
+    def put(self, key, value):
+        now = time.time()
+        try:
+            self.store.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires, last_used) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now + self.ttl, now)
+            )
+            self.store.execute("DELETE FROM cache WHERE namespace = ? AND expires <= ?", (self.namespace, now))
+            self.stats["evictions"] += self.store.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.namespace, self.namespace, self.maxsize)).rowcount
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not cache {self.namespace} entry {key}: {str(e)}")
+
+    def invalidate(self, key):
+        return self.store.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)).rowcount > 0
+
+    def keys(self):
+        rows = self.store.execute(
+            "SELECT key FROM cache WHERE namespace = ? AND expires > ? ORDER BY last_used", (self.namespace, time.time())
+        )
+        return [row[0] for row in rows]
+
+    def __len__(self):
+        return self.store.execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires > ?", (self.namespace, time.time())
+        ).fetchone()[0]
+
+# Parsed Shopify order payloads keyed by order ID
+if STATE_BACKEND == "sqlite":
+    shopify_order_cache = SQLiteTTLCache(state_store, "shopify_order", SHOPIFY_CACHE_SIZE, SHOPIFY_CACHE_TTL)
+else:
+    shopify_order_cache = TTLCache(SHOPIFY_CACHE_SIZE, SHOPIFY_CACHE_TTL)
+# In-flight downloads, so concurrent misses for one order share a request
+shopify_inflight = {}
+
+# When a webhook last changed each order, so a download that started earlier
+# does not overwrite fresher webhook data. Marks are only needed while such a
+# download can still be running, so they are dropped after
+# SHOPIFY_UPDATE_MARK_SECONDS; a download that takes longer is not cached.
+SHOPIFY_UPDATE_MARK_SECONDS = 300
+
+def shopify_order_updated_at(order_id):
+    return state_store.get(f"shopify_order_updated:{order_id}")
+
+def mark_shopify_order_updated(order_id):
+    now = time.time()
+    state_store.raise_to(f"shopify_order_updated:{order_id}", now)
+    state_store.discard_below("shopify_order_updated:", now - SHOPIFY_UPDATE_MARK_SECONDS)
+SHOPIFY_CACHE_STATS = {"coalesced": 0, "webhook_updates": 0, "webhook_invalidations": 0}
+
+async def download_shopify_order(order_id: str) -> dict:
+    """
+    Download and parse an order from your Shopify endpoint
     """
     try:
         # Construct the full URL with order ID
         encoded_order_id = quote(order_id, safe='')
         url = f"{SHOPIFY_ORDER_ENDPOINT}{encoded_order_id}"
         
-        
         logger.info(f"Fetching Shopify order from: {url}")
         
         # Make the request to your endpoint
-        response = requests.get(url, timeout=30)
+        response = await send_request("shopify", "GET", url)
         
         if response.status_code == 404:
             raise Exception(f"Order {order_id} not found")
-        elif not response.ok:
+        elif not response.is_success:
             raise Exception(f"API error: {response.status_code} - {response.text}")
         
         # Parse the response
-        order_data = response.json()
+        return response.json()
         
-        # Format the order details for verification
-        # Adjust this based on your actual API response structure
-        formatted_order = f"""Shopify Order Details:
+    except CircuitOpenError as e:
+        logger.error(f"Shopify endpoint circuit open, not fetching order {order_id}")
+        raise Exception(f"Shopify endpoint is temporarily unavailable. Please try again in {e.retry_in:.0f} seconds.")
+    except httpx.TimeoutException:
+        logger.error(f"Request timed out for order {order_id}")
+        raise Exception("Request timed out. Please try again.")
+    except httpx.RequestError as e:
+        logger.error(f"Request failed for order {order_id}: {str(e)}")
+        raise Exception(f"Failed to connect to Shopify endpoint: {str(e)}")
+
+async def get_shopify_order_data(order_id: str) -> dict:
+    """
+    Return the parsed order payload, from the cache when possible.
+    Concurrent misses for the same order are served by a single download.
+    """
+    order_id = order_id.strip()
+    order_data = shopify_order_cache.get(order_id)
+    if order_data is not None:
+        logger.info(f"Shopify order {order_id} served from cache")
+        return order_data
+    
+    task = shopify_inflight.get(order_id)
+    if task is not None:
+        SHOPIFY_CACHE_STATS["coalesced"] += 1
+    else:
+        started = time.time()
+
+        async def download():
+            order_data = await download_shopify_order(order_id)
+            if time.time() - started < SHOPIFY_UPDATE_MARK_SECONDS and shopify_order_updated_at(order_id) < started:
+                shopify_order_cache.put(order_id, order_data)
+            return order_data
+
+        task = asyncio.create_task(download())
+        shopify_inflight[order_id] = task
+        task.add_done_callback(lambda _: shopify_inflight.pop(order_id, None))
+    
+    # Shield the shared download so one cancelled caller does not cancel it for the others
+    return await asyncio.shield(task)
+
+def update_cached_shopify_order(order_data: dict):
+    """
+    Store an order pushed by a Shopify webhook and drop stale aliases
+    """
+    order_id = str(order_data["id"])
+    mark_shopify_order_updated(order_id)
+    shopify_order_cache.put(order_id, order_data)
+    # Staff may also look the order up by its name or number
+    for alias in (order_data.get("name"), order_data.get("order_number")):
+        if alias is not None and str(alias) != order_id:
+            invalidate_cached_shopify_order(str(alias))
+    SHOPIFY_CACHE_STATS["webhook_updates"] += 1
+
+def invalidate_cached_shopify_order(order_id: str):
+    """
+    Drop an order from the cache
+    """
+    mark_shopify_order_updated(order_id)
+    if shopify_order_cache.invalidate(order_id):
+        SHOPIFY_CACHE_STATS["webhook_invalidations"] += 1
+
+# Only the cushion-relevant parts of an order are sent to the model. Line item
+# properties are mapped onto the attributes the verification checks; anything
+# else on the order (customer, shipping, payment blocks) is left out.
+COMPACT_ORDER_PAYLOAD = os.getenv("COMPACT_ORDER_PAYLOAD", "true").lower() == "true"
+
+# Property name keywords for each cushion attribute, checked in order. Piping
+# and ties come first so "Welt Color" or "Tie Length" is not taken for the
+# fabric color or a dimension.
+CUSHION_PROPERTY_KEYWORDS = [
+    ("piping", ["piping", "welt", "cord"]),
+    ("ties", ["tie"]),
+    ("shape", ["shape"]),
+    ("dimensions", ["dimension", "size", "width", "length", "depth", "height", "thickness", "diameter"]),
+    ("fabric", ["fabric", "material", "color", "colour", "pattern"]),
+    ("fill", ["fill", "foam", "insert", "core"]),
+]
+
+class CushionLineItem(BaseModel):
+    title: str
+    variant: str = ""
+    sku: str = ""
+    quantity: int = 1
+    shape: List[str] = []
+    dimensions: List[str] = []
+    fabric: List[str] = []
+    fill: List[str] = []
+    piping: List[str] = []
+    ties: List[str] = []
+    other: List[str] = []
+
+class OrderSummary(BaseModel):
+    order_id: str
+    name: str = ""
+    note: str = ""
+    line_items: List[CushionLineItem] = []
+
+def _line_item_properties(item):
+    properties = item.get("properties") or []
+    if isinstance(properties, dict):
+        return list(properties.items())
+    return [(prop.get("name", ""), prop.get("value", "")) for prop in properties if isinstance(prop, dict)]
+
+def summarize_order(order_id: str, order_data: dict) -> OrderSummary:
+    """
+    Pull the line items and their cushion properties out of an order payload
+    """
+    order = order_data.get("order", order_data) if isinstance(order_data, dict) else {}
+    summary = OrderSummary(
+        order_id=str(order.get("id") or order_id),
+        name=str(order.get("name") or ""),
+        note=str(order.get("note") or ""),
+    )
+    for item in order.get("line_items") or []:
+        line_item = CushionLineItem(
+            title=str(item.get("title") or item.get("name") or ""),
+            variant=str(item.get("variant_title") or ""),
+            sku=str(item.get("sku") or ""),
+            quantity=int(item.get("quantity") or 1),
+        )
+        for name, value in _line_item_properties(item):
+            name, value = str(name).strip(), str(value).strip()
+            # Shopify uses a leading underscore for hidden, non-customer properties
+            if not name or name.startswith("_") or not value:
+                continue
+            lowered = name.lower()
+            for attribute, keywords in CUSHION_PROPERTY_KEYWORDS:
+                # Keywords start a word ("tie" is not in "quantities"); underscores still separate
+                if any(re.search(rf"(?<![a-z]){keyword}", lowered) for keyword in keywords):
+                    getattr(line_item, attribute).append(value if lowered == attribute else f"{name}: {value}")
+                    break
+            else:
+                line_item.other.append(f"{name}: {value}")
+        summary.line_items.append(line_item)
+    return summary
+
+def render_order_summary(summary: OrderSummary) -> str:
+    """
+    Render an order summary as compact text for the prompt
+    """
+    lines = [f"Shopify Order {summary.name or summary.order_id} (ID {summary.order_id})"]
+    if summary.note:
+        lines.append(f"Order note: {summary.note}")
+    for index, item in enumerate(summary.line_items, start=1):
+        title = f"{item.title} - {item.variant}" if item.variant else item.title
+        lines.append(f"Item {index}: {title}; Quantity: {item.quantity}" + (f"; SKU: {item.sku}" if item.sku else ""))
+        for attribute in ["shape", "dimensions", "fabric", "fill", "piping", "ties", "other"]:
+            values = getattr(item, attribute)
+            if values:
+                lines.append(f"  {attribute.capitalize()}: {'; '.join(values)}")
+    return "\n".join(lines)
+
+def format_shopify_order(order_id: str, order_data: dict) -> str:
+    """
+    Format order data for verification
+    """
+    if COMPACT_ORDER_PAYLOAD:
+        summary = summarize_order(order_id, order_data)
+        if summary.line_items:
+            return render_order_summary(summary)
+        # Unknown payload shape; fall back to the raw data without whitespace
+        return f"Shopify Order Details:\nOrder ID: {order_id}\nOrder Data: {json.dumps(order_data, separators=(',', ':'))}"
+    return f"""Shopify Order Details:
 Order ID: {order_id}
 Order Data: {json.dumps(order_data, indent=2)}"""
+
+async def fetch_shopify_order(order_id: str) -> str:
+    """
+    Fetch order details from your Shopify endpoint
+    """
+    try:
+        order_data = await get_shopify_order_data(order_id)
+        
+        formatted_order = format_shopify_order(order_id, order_data)
         
         logger.info(f"Successfully fetched Shopify order {order_id}")
         return formatted_order
         
-    except requests.exceptions.Timeout:
-        logger.error(f"Request timed out for order {order_id}")
-        raise Exception("Request timed out. Please try again.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed for order {order_id}: {str(e)}")
-        raise Exception(f"Failed to connect to Shopify endpoint: {str(e)}")
     except Exception as e:
         logger.error(f"Error fetching Shopify order {order_id}: {str(e)}")
         raise
 
-def call_custom_gpt_assistant(final_order, customer_context=""):
+# Assistants runs are streamed by default so the result arrives as soon as
+# the run completes. Polling is only used when the server does not stream.
+ASSISTANT_STREAM_RUNS = os.getenv("ASSISTANT_STREAM_RUNS", "true").lower() == "true"
+RUN_POLL_INITIAL_DELAY = 0.25  # seconds
+RUN_POLL_MAX_DELAY = 2.0  # seconds
+RUN_POLL_TIMEOUT = 60  # seconds
+
+def extract_message_text(message):
+    """
+    Extract the text from an Assistants message object
+    """
+    content = message["content"]
+    # Content is a list of content blocks
+    if isinstance(content, list) and len(content) > 0:
+        return content[0].get("text", {}).get("value", "")
+    return str(content)
+
+async def iter_sse_events(response):
+    """
+    Yield (event, data) pairs from a server-sent events response
+    """
+    event, data_lines = None, []
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield event, "\n".join(data_lines)
+            event, data_lines = None, []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data_lines.append(value)
+    if data_lines:
+        yield event, "\n".join(data_lines)
+
+async def stream_run(headers, url, run_data, on_created=None):
+    """
+    Create a run with streaming enabled and consume its events as they arrive.
+    Returns (run, text). text is None when the result could not be taken
+    from the stream and the run has to be polled instead. `on_created` is
+    called with the run object as soon as the run exists.
+    """
+    run = None
+    text = None
+    completed = False
+    response = await send_request("openai_assistants", "POST", url, stream=True, headers=headers, json={**run_data, "stream": True})
+    try:
+        if not response.is_success:
+            await response.aread()
+            logger.error(f"Run creation failed: {response.status_code} - {response.text}")
+            raise_for_rate_limit(response)
+            raise Exception(f"Run creation failed: {response.status_code} - {response.text}")
+        
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            # Server ignored the stream flag and returned the run object
+            await response.aread()
+            run = response.json()
+            if on_created:
+                on_created(run)
+            return run, None
+        
+        async for event, data in iter_sse_events(response):
+            if data == "[DONE]":
+                break
+            payload = json.loads(data)
+            if event == "thread.run.created":
+                run = payload
+                logger.info(f"Run created successfully with ID: {run['id']}")
+                if on_created:
+                    on_created(run)
+            elif event == "thread.message.completed" and payload.get("role") == "assistant":
+                text = extract_message_text(payload)
+            elif event == "thread.run.completed":
+                completed = True
+                record_token_usage(payload.get("model") or "assistant", payload.get("usage"))
+            elif event in ["thread.run.failed", "thread.run.cancelled", "thread.run.expired"]:
+                status = event.rsplit(".", 1)[1]
+                logger.error(f"Run {status}: {payload}")
+                raise Exception(f"Run {status}: {payload}")
+            elif event == "error":
+                logger.error(f"Run stream error: {payload}")
+                raise Exception(f"Run stream error: {payload}")
+    finally:
+        await response.aclose()
+    
+    if completed and text is not None:
+        return run, text
+    if run is None:
+        raise Exception("Run stream ended before the run was created")
+    logger.warning(f"Run stream for {run['id']} ended without a result, falling back to polling")
+    return run, None
+
+async def wait_for_run(headers, thread_id, run_id):
+    """
+    Poll a run until it completes, backing off adaptively between checks.
+    Returns the number of status requests made.
+    """
+    delay = RUN_POLL_INITIAL_DELAY
+    deadline = time.monotonic() + RUN_POLL_TIMEOUT
+    attempt = 0
+    while True:
+        attempt += 1
+        run_status_response = await send_request(
+            "openai_assistants", "GET",
+            RUNS_ENDPOINT.format(thread_id=thread_id) + f"/{run_id}",
+            headers=headers
+        )
+        
+        if not run_status_response.is_success:
+            logger.error(f"Run status check failed: {run_status_response.status_code} - {run_status_response.text}")
+            raise_for_rate_limit(run_status_response)
+            raise Exception(f"Run status check failed: {run_status_response.status_code} - {run_status_response.text}")
+        
+        status = run_status_response.json()["status"]
+        logger.info(f"Run status (attempt {attempt}): {status}")
+        
+        if status == "completed":
+            run = run_status_response.json()
+            record_token_usage(run.get("model") or "assistant", run.get("usage"))
+            return attempt
+        elif status in ["failed", "cancelled", "expired"]:
+            logger.error(f"Run {status}: {run_status_response.json()}")
+            raise Exception(f"Run {status}: {run_status_response.json()}")
+        
+        if time.monotonic() + delay > deadline:
+            raise Exception(f"Run did not complete within {RUN_POLL_TIMEOUT} seconds")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RUN_POLL_MAX_DELAY)
+
+# Each verification runs on its own thread, created together with the run.
+# Threads are deleted in the background once the verification is done;
+# threads whose verification never finished are collected after a grace
+# period.
+THREAD_GC_INTERVAL = float(os.getenv("THREAD_GC_INTERVAL", "30"))  # seconds
+THREAD_ORPHAN_TTL = float(os.getenv("THREAD_ORPHAN_TTL", "600"))  # seconds
+
+# thread_id -> monotonic time after which the thread may be deleted
+assistant_threads = {}
+
+ASSISTANT_STATS = {
+    "verifications": 0,
+    "round_trips": 0,
+    "threads_created": 0,
+    "threads_deleted": 0,
+    "thread_delete_failures": 0,
+}
+
+def track_assistant_thread(thread_id, delay):
+    """
+    Schedule an assistant thread for deletion `delay` seconds from now
+    """
+    assistant_threads[thread_id] = time.monotonic() + delay
+
+async def collect_assistant_threads():
+    """
+    Background task that deletes assistant threads once they are due
+    """
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "OpenAI-Beta": "assistants=v2"
+    }
+    while True:
+        await asyncio.sleep(THREAD_GC_INTERVAL)
+        now = time.monotonic()
+        due = [thread_id for thread_id, due_at in assistant_threads.items() if due_at <= now]
+        for thread_id in due:
+            try:
+                response = await send_request(
+                    "openai_assistants", "DELETE",
+                    THREAD_ENDPOINT.format(thread_id=thread_id),
+                    headers=headers
+                )
+                # A 404 means the thread is already gone
+                if response.is_success or response.status_code == 404:
+                    assistant_threads.pop(thread_id, None)
+                    ASSISTANT_STATS["threads_deleted"] += 1
+                    continue
+                logger.warning(f"Thread deletion failed for {thread_id}: {response.status_code}")
+            except httpx.HTTPError as e:
+                logger.warning(f"Thread deletion failed for {thread_id}: {str(e)}")
+            ASSISTANT_STATS["thread_delete_failures"] += 1
+            track_assistant_thread(thread_id, THREAD_GC_INTERVAL)
+
+async def call_custom_gpt_assistant(final_order, customer_context=""):
     """
     Call a custom GPT assistant using OpenAI's Assistants API
     """
@@ -116,23 +1477,17 @@ def call_custom_gpt_assistant(final_order, customer_context=""):
         "OpenAI-Beta": "assistants=v2"
     }
     
+    round_trips = 0
+    thread_id = None
+    
+    def on_run_created(run):
+        nonlocal thread_id
+        thread_id = run["thread_id"]
+        ASSISTANT_STATS["threads_created"] += 1
+        # Until the verification finishes the thread is only collected as an orphan
+        track_assistant_thread(thread_id, THREAD_ORPHAN_TTL)
+    
     try:
-        logger.info(f"Creating thread with assistant ID: {CUSTOM_ASSISTANT_ID}")
-        
-        # Create a new empty thread
-        thread_response = requests.post(THREADS_ENDPOINT, headers=headers, json={})
-        
-        # Log the response for debugging
-        logger.info(f"Thread creation response status: {thread_response.status_code}")
-        logger.info(f"Thread creation response: {thread_response.text}")
-        
-        if not thread_response.ok:
-            logger.error(f"Thread creation failed: {thread_response.status_code} - {thread_response.text}")
-            raise Exception(f"Thread creation failed: {thread_response.status_code} - {thread_response.text}")
-        
-        thread_id = thread_response.json()["id"]
-        logger.info(f"Thread created successfully with ID: {thread_id}")
-        
         # Prepare the complete message with final order and customer context
         complete_message = f"""Please analyze the following order for verification and provide results in this EXACT format:
 
@@ -165,95 +1520,56 @@ Final Order for Verification:
 Customer Communication Context:
 {customer_context}"""
         
-        # Add the user message to the thread
-        message_data = {
-            "role": "user",
-            "content": complete_message
+        # Create the thread, its message and the run in a single request
+        run_data = {
+            "assistant_id": CUSTOM_ASSISTANT_ID,
+            "thread": {
+                "messages": [{"role": "user", "content": complete_message}]
+            }
         }
+        logger.info(f"Creating thread and run with assistant ID: {CUSTOM_ASSISTANT_ID}")
+        logger.debug(f"Thread message: {complete_message[:100]}...")
         
-        logger.info(f"Adding message to thread: {complete_message[:100]}...")
-        message_response = requests.post(
-            MESSAGES_ENDPOINT.format(thread_id=thread_id),
-            headers=headers,
-            json=message_data
-        )
-        
-        if not message_response.ok:
-            logger.error(f"Message creation failed: {message_response.status_code} - {message_response.text}")
-            raise Exception(f"Message creation failed: {message_response.status_code} - {message_response.text}")
-        
-        logger.info("Message added successfully")
-        
-        # Create a run with the custom assistant
-        run_data = {"assistant_id": CUSTOM_ASSISTANT_ID}
-        logger.info(f"Creating run with assistant ID: {CUSTOM_ASSISTANT_ID}")
-        
-        run_response = requests.post(
-            RUNS_ENDPOINT.format(thread_id=thread_id), 
-            headers=headers, 
-            json=run_data
-        )
-        
-        if not run_response.ok:
-            logger.error(f"Run creation failed: {run_response.status_code} - {run_response.text}")
-            raise Exception(f"Run creation failed: {run_response.status_code} - {run_response.text}")
-        
-        run_id = run_response.json()["id"]
-        logger.info(f"Run created successfully with ID: {run_id}")
+        text_content = None
+        round_trips += 1
+        if ASSISTANT_STREAM_RUNS:
+            run, text_content = await stream_run(headers, THREAD_RUNS_ENDPOINT, run_data, on_run_created)
+        else:
+            run_response = await send_request("openai_assistants", "POST", THREAD_RUNS_ENDPOINT, headers=headers, json=run_data)
+            
+            if not run_response.is_success:
+                logger.error(f"Run creation failed: {run_response.status_code} - {run_response.text}")
+                raise_for_rate_limit(run_response)
+                raise Exception(f"Run creation failed: {run_response.status_code} - {run_response.text}")
+            
+            run = run_response.json()
+            on_run_created(run)
+            logger.info(f"Run created successfully with ID: {run['id']}")
         
-        # Poll for completion
-        max_attempts = 30
-        for attempt in range(max_attempts):
-            run_status_response = requests.get(
-                RUNS_ENDPOINT.format(thread_id=thread_id) + f"/{run_id}",
+        if text_content is None:
+            round_trips += await wait_for_run(headers, thread_id, run["id"])
+            
+            # Get the messages from the thread
+            round_trips += 1
+            messages_response = await send_request(
+                "openai_assistants", "GET",
+                MESSAGES_ENDPOINT.format(thread_id=thread_id),
                 headers=headers
             )
             
-            if not run_status_response.ok:
-                logger.error(f"Run status check failed: {run_status_response.status_code} - {run_status_response.text}")
-                raise Exception(f"Run status check failed: {run_status_response.status_code} - {run_status_response.text}")
+            if not messages_response.is_success:
+                logger.error(f"Messages retrieval failed: {messages_response.status_code} - {messages_response.text}")
+                raise_for_rate_limit(messages_response)
+                raise Exception(f"Messages retrieval failed: {messages_response.status_code} - {messages_response.text}")
             
-            status = run_status_response.json()["status"]
-            logger.info(f"Run status (attempt {attempt + 1}/{max_attempts}): {status}")
+            messages = messages_response.json()["data"]
             
-            if status == "completed":
-                break
-            elif status in ["failed", "cancelled", "expired"]:
-                logger.error(f"Run {status}: {run_status_response.json()}")
-                raise Exception(f"Run {status}: {run_status_response.json()}")
+            # Find the assistant's response (the last message from assistant)
+            assistant_messages = [msg for msg in messages if msg["role"] == "assistant"]
+            if not assistant_messages:
+                raise Exception("No assistant response found")
             
-            import time
-            time.sleep(2)  # Wait 2 seconds before checking again
-        
-        if status != "completed":
-            raise Exception(f"Run did not complete within {max_attempts * 2} seconds")
-        
-        # Get the messages from the thread
-        messages_response = requests.get(
-            MESSAGES_ENDPOINT.format(thread_id=thread_id),
-            headers=headers
-        )
-        
-        if not messages_response.ok:
-            logger.error(f"Messages retrieval failed: {messages_response.status_code} - {messages_response.text}")
-            raise Exception(f"Messages retrieval failed: {messages_response.status_code} - {messages_response.text}")
-        
-        messages = messages_response.json()["data"]
-        
-        # Find the assistant's response (the last message from assistant)
-        assistant_messages = [msg for msg in messages if msg["role"] == "assistant"]
-        if not assistant_messages:
-            raise Exception("No assistant response found")
-        
-        # Get the content from the last assistant message
-        last_assistant_message = assistant_messages[-1]
-        content = last_assistant_message["content"]
-        
-        # Extract text from content (content is a list of content blocks)
-        if isinstance(content, list) and len(content) > 0:
-            text_content = content[0].get("text", {}).get("value", "")
-        else:
-            text_content = str(content)
+            text_content = extract_message_text(assistant_messages[-1])
         
         logger.info(f"Custom GPT response received, length: {len(text_content)}")
         return text_content
@@ -261,16 +1577,30 @@ Customer Communication Context:
     except Exception as e:
         logger.error(f"Error calling custom GPT assistant: {str(e)}")
         raise
+    finally:
+        ASSISTANT_STATS["verifications"] += 1
+        ASSISTANT_STATS["round_trips"] += round_trips
+        if thread_id:
+            track_assistant_thread(thread_id, 0)
 
-def call_standard_gpt(final_order, customer_context=""):
+async def call_standard_gpt(final_order, customer_context="", attributes=None, on_row=None):
     """
-    Call standard GPT-4 using chat completions API
+    Call standard GPT-4 using chat completions API.
+    When `attributes` is given, only those attributes are requested.
+    When `on_row` is given the response is streamed and each verification
+    row is passed to it as soon as its line is complete.
     """
     # Prepare the complete message with final order and customer context
     complete_message = f"Final Order for Verification:\n{final_order}"
     
     if customer_context:
         complete_message += f"\n\nCustomer Communication Context:\n{customer_context}"
+
+    if attributes:
+        complete_message += (
+            "\n\nThe other attributes were already verified. Report ONLY these attributes, "
+            f"one line each, in the same format: {', '.join(attributes)}"
+        )
     
     messages = [
         {"role": "system", "content": """You are an expert cushion order verifier. Your task is to:
@@ -307,17 +1637,868 @@ CRITICAL REQUIREMENTS:
     }
 
     payload = {
-        "model": "gpt-4",
+        "model": GPT_MODEL,
         "messages": messages,
         "temperature": 0
     }
 
-    response = requests.post(GPT_ENDPOINT, headers=headers, json=payload)
+    if on_row is not None:
+        return await stream_standard_gpt(headers, payload, on_row)
+
+    response = await send_hedged_request("openai_chat", "POST", GPT_ENDPOINT, GPT_HEDGE_AFTER, headers=headers, json=payload)
     response.raise_for_status()
     
     response_data = response.json()
+    record_token_usage(GPT_MODEL, response_data.get("usage"))
     return response_data["choices"][0]["message"]["content"]
 
+async def stream_standard_gpt(headers, payload, on_row):
+    """
+    Stream a chat completion, passing each parsed verification row to `on_row`
+    as its line completes. Returns the full response text.
+    """
+    text = ""
+    line_start = 0
+
+    async def emit_complete_lines(final=False):
+        nonlocal line_start
+        while True:
+            end = text.find("\n", line_start)
+            if end == -1:
+                if not final:
+                    return
+                end = len(text)
+            row = parse_verification_row(text[line_start:end])
+            line_start = end + 1
+            if row:
+                await on_row(row)
+            if line_start > len(text):
+                return
+
+    response = await send_hedged_request(
+        "openai_chat", "POST", GPT_ENDPOINT, GPT_HEDGE_AFTER,
+        stream=True, headers=headers,
+        json={**payload, "stream": True, "stream_options": {"include_usage": True}}
+    )
+    try:
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+        async for _, data in iter_sse_events(response):
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # The last chunk carries token usage and no choices
+            record_token_usage(GPT_MODEL, chunk.get("usage"))
+            choices = chunk.get("choices") or [{}]
+            text += choices[0].get("delta", {}).get("content") or ""
+            await emit_complete_lines()
+    finally:
+        await response.aclose()
+    await emit_complete_lines(final=True)
+    return text
+
+# Deterministic pre-verification. Attributes that can be checked mechanically
+# (dimensions, quantity, piping, ties, shape, fabric, color, fill) are
+# decided locally when both the order and the customer communication state
+# a single clear value. Everything else is left to the model, and the model
+# call is skipped entirely when nothing is left.
+PRE_VERIFY = os.getenv("PRE_VERIFY", "true").lower() == "true"
+FABRIC_CATALOG_PATH = os.getenv("FABRIC_CATALOG_PATH")
+
+VERIFICATION_ATTRIBUTES = [
+    "Cushion Type",
+    "Shape",
+    "Dimensions",
+    "Fabric",
+    "Color or Pattern",
+    "Foam or Fill Type",
+    "Ties",
+    "Piping",
+    "Quantity per type/variant",
+    "Special Requests",
+]
+
+# canonical name -> (aliases, parent). A value and its parent (e.g. a
+# Sunbrella collection and "Sunbrella") are too vague to compare.
+FABRIC_CATALOG = {
+    "Sunbrella": (["sunbrella"], None),
+    "Sunbrella Canvas": (["sunbrella canvas"], "Sunbrella"),
+    "Sunbrella Spectrum": (["sunbrella spectrum"], "Sunbrella"),
+    "Sunbrella Cast": (["sunbrella cast"], "Sunbrella"),
+    "Sunbrella Linen": (["sunbrella linen"], "Sunbrella"),
+    "Sunbrella Sling": (["sunbrella sling"], "Sunbrella"),
+    "Agora": (["agora"], None),
+    "Outdura": (["outdura"], None),
+    "Phifertex": (["phifertex"], None),
+    "Chenille": (["chenille"], None),
+    "Velvet": (["velvet"], None),
+    "Olefin": (["olefin"], None),
+    "Marine Vinyl": (["marine vinyl", "vinyl"], None),
+    "Cotton": (["cotton"], None),
+    "Linen": (["linen"], None),
+}
+
+COLOR_CATALOG = {
+    "Navy": (["navy", "navy blue"], "Blue"),
+    "Blue": (["blue"], None),
+    "Black": (["black"], None),
+    "White": (["white"], None),
+    "Grey": (["grey", "gray"], None),
+    "Charcoal": (["charcoal"], "Grey"),
+    "Beige": (["beige"], None),
+    "Tan": (["tan"], "Beige"),
+    "Taupe": (["taupe"], None),
+    "Brown": (["brown"], None),
+    "Red": (["red"], None),
+    "Green": (["green"], None),
+    "Teal": (["teal"], "Blue"),
+    "Yellow": (["yellow"], None),
+    "Orange": (["orange"], None),
+    "Pink": (["pink"], None),
+    "Purple": (["purple"], None),
+    "Cream": (["cream"], "White"),
+    "Ivory": (["ivory"], "White"),
+    "Pearl": (["pearl"], "White"),
+}
+
+# Pattern words make a color comparison unreliable
+PATTERN_WORDS = ["stripe", "striped", "floral", "plaid", "pattern", "print", "check", "geometric"]
+
+CUSHION_TYPE_CATALOG = {
+    "Seat": (["seat cushion", "seat cushions", "seat pad", "seat pads", "seat"], None),
+    "Back": (["back cushion", "back cushions", "backrest", "back rest"], None),
+    "Bench": (["bench cushion", "bench cushions", "bench"], None),
+    "Chaise": (["chaise lounge", "chaise"], None),
+    "Window Seat": (["window seat", "window seat cushion"], None),
+    "Boat": (["boat cushion", "boat seat", "marine cushion"], None),
+    "Dining Chair": (["dining chair", "chair pad", "chair pads"], None),
+    "Floor": (["floor cushion", "floor pillow"], None),
+    "Swing": (["swing cushion", "porch swing"], None),
+    "Daybed": (["daybed", "day bed"], None),
+}
+
+SHAPE_CATALOG = {
+    "Rectangle": (["rectangle", "rectangular"], None),
+    "Square": (["square"], "Rectangle"),
+    "Round": (["round", "circle", "circular"], None),
+    "Half Round": (["half round", "half-round", "half moon", "half-moon", "semicircle"], None),
+    "Trapezoid": (["trapezoid", "trapezoidal"], None),
+    "T-Shape": (["t-cushion", "t cushion", "t-shape", "t-shaped", "t shape"], None),
+    "L-Shape": (["l-shape", "l-shaped", "l shape"], None),
+    "Bullnose": (["bullnose", "bull nose"], None),
+    "Triangle": (["triangle", "triangular"], None),
+    "Hexagon": (["hexagon", "hexagonal"], None),
+    "Octagon": (["octagon", "octagonal"], None),
+}
+
+FILL_CATALOG = {
+    "Foam": (["foam"], None),
+    "High Density Foam": (["high density foam", "high-density foam", "hd foam"], "Foam"),
+    "Dryfast Foam": (["dryfast foam", "dry fast foam", "quick dry foam", "dryfast"], "Foam"),
+    "Memory Foam": (["memory foam"], "Foam"),
+    "Fiber Fill": (["fiber fill", "fiberfill", "fibre fill", "polyfill", "poly fill", "polyester fill"], None),
+    "Down": (["down fill", "down feather", "feather"], None),
+    "Cover Only": (["cover only", "covers only", "no insert", "no fill", "without insert"], None),
+}
+
+if FABRIC_CATALOG_PATH:
+    try:
+        with open(FABRIC_CATALOG_PATH, "r", encoding="utf-8") as f:
+            for canonical, aliases in json.load(f).items():
+                FABRIC_CATALOG[canonical] = ([alias.lower() for alias in aliases], None)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load fabric catalog {FABRIC_CATALOG_PATH}: {str(e)}")
+
+NEGATION_RE = re.compile(r"\b(?:not|no|don't|dont|do not|without|instead of|rather than)\W+(?:\w+\W+){0,2}$")
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "a pair of": 2,
+}
+
+PRE_VERIFY_STATS = {
+    "verifications": 0,
+    "fully_local": 0,
+    "attributes_total": 0,
+    "attributes_local": 0,
+    "llm_calls": 0,
+    "llm_seconds": 0.0,
+    "llm_prompt_chars": 0,
+    "llm_calls_skipped": 0,
+    "llm_prompt_chars_skipped": 0,
+}
+
+def find_catalog_values(text, catalog):
+    """
+    Return (values, negated) for the catalog entries mentioned in `text`.
+    Longer aliases win over the shorter ones they contain.
+    """
+    lowered = text.lower()
+    aliases = sorted(
+        ((alias, canonical) for canonical, (names, _) in catalog.items() for alias in names),
+        key=lambda pair: -len(pair[0])
+    )
+    taken = []
+    values = set()
+    negated = False
+    for alias, canonical in aliases:
+        for match in re.finditer(rf"(?<![\w-]){re.escape(alias)}(?![\w-])", lowered):
+            start, end = match.span()
+            if any(start < taken_end and end > taken_start for taken_start, taken_end in taken):
+                continue
+            taken.append((start, end))
+            values.add(canonical)
+            if NEGATION_RE.search(lowered[max(0, start - 40):start]):
+                negated = True
+    # A collection makes its bare parent redundant
+    values -= {catalog[value][1] for value in values if catalog[value][1] in values}
+    return values, negated
+
+def compare_catalog_attribute(attribute, order_text, context_text, catalog, siblings_related=False):
+    """
+    Match/Mismatch line when each side names exactly one catalog value, else None.
+    With `siblings_related`, two values under the same parent are not a clear mismatch either.
+    """
+    order_values, order_negated = find_catalog_values(order_text, catalog)
+    context_values, context_negated = find_catalog_values(context_text, catalog)
+    if order_negated or context_negated or len(order_values) != 1 or len(context_values) != 1:
+        return None
+    order_value, context_value = order_values.pop(), context_values.pop()
+    if order_value == context_value:
+        return f"{attribute}: Match (Order: {order_value}; Customer: {context_value})"
+    # One side is just the parent of the other; not enough to decide
+    if catalog[order_value][1] == context_value or catalog[context_value][1] == order_value:
+        return None
+    if siblings_related and catalog[order_value][1] and catalog[order_value][1] == catalog[context_value][1]:
+        return None
+    return f"{attribute}: Mismatch (Order: {order_value}; Customer: {context_value})"
+
+NUMBER_PATTERN = r"\d+(?:\.\d+)?(?:\s+\d+/\d+)?|\d+/\d+"
+UNIT_PATTERN = r"(?:\s*(?:\"|”|''|inches|inch|in\b|cm\b|mm\b|feet|foot|ft\b|'))?"
+DIMENSION_SET_RE = re.compile(
+    rf"({NUMBER_PATTERN})({UNIT_PATTERN})\s*(?:x|×|by|\*)\s*({NUMBER_PATTERN})({UNIT_PATTERN})"
+    rf"(?:\s*(?:x|×|by|\*)\s*({NUMBER_PATTERN})({UNIT_PATTERN}))?",
+    re.IGNORECASE
+)
+MEASURE_RE = re.compile(rf"({NUMBER_PATTERN})({UNIT_PATTERN})", re.IGNORECASE)
+
+def to_inches(number, unit):
+    number = number.strip()
+    if " " in number:
+        whole, fraction = number.split(None, 1)
+        value = float(whole) + to_inches(fraction, "")
+    elif "/" in number:
+        numerator, denominator = number.split("/")
+        value = float(numerator) / float(denominator) if float(denominator) else 0.0
+    else:
+        value = float(number)
+    unit = unit.strip().lower()
+    if unit in ["cm"]:
+        return value / 2.54
+    if unit in ["mm"]:
+        return value / 25.4
+    if unit in ["ft", "feet", "foot", "'"]:
+        return value * 12
+    return value
+
+def find_dimension_sets(text):
+    sets = []
+    for match in DIMENSION_SET_RE.finditer(text):
+        groups = match.groups()
+        numbers = [(groups[i], groups[i + 1] or "") for i in range(0, 6, 2) if groups[i]]
+        # A unit written only once ("20 x 20 x 3 in") applies to all numbers
+        last_unit = next((unit for _, unit in reversed(numbers) if unit.strip()), "")
+        sets.append([round(to_inches(number, unit or last_unit), 2) for number, unit in numbers])
+    return sets
+
+def order_field(order_text, label):
+    """
+    Return the value of an attribute line from a compact order summary, or None
+    """
+    match = re.search(rf"^\s+{re.escape(label)}: (.+)$", order_text, re.MULTILINE)
+    return match.group(1) if match else None
+
+def format_dimensions(values):
+    return " x ".join(f"{value:g}" for value in values) + " in"
+
+def compare_dimensions(order_text, context_text):
+    field = order_field(order_text, "Dimensions")
+    if field is not None:
+        order_sets = [[round(to_inches(n, u), 2) for n, u in MEASURE_RE.findall(field)]]
+    else:
+        order_sets = find_dimension_sets(order_text)
+    context_sets = find_dimension_sets(context_text)
+    if len(order_sets) != 1 or len(context_sets) != 1:
+        return None
+    order_dims, context_dims = order_sets[0], context_sets[0]
+    if len(order_dims) != len(context_dims):
+        return None
+    details = f"Order: {format_dimensions(order_dims)}; Customer: {format_dimensions(context_dims)}"
+    # Sides may be listed in any order
+    if all(abs(a - b) <= 0.25 for a, b in zip(sorted(order_dims), sorted(context_dims))):
+        return f"Dimensions: Match ({details})"
+    return f"Dimensions: Mismatch ({details})"
+
+# A number followed by one of these is a measurement, not a count
+NOT_A_COUNT = r"(?!\s*(?:x\b|×|by\b|\*|\"|”|''|inches|inch|in\b|cm\b|mm\b|feet|foot|ft\b|'))"
+QUANTITY_RE = re.compile(
+    rf"\b(?:quantity|qty)\s*(?:of|:|=)?\s*(\d+)\b{NOT_A_COUNT}"
+    r"|\b(\d+|" + "|".join(NUMBER_WORDS) + rf")\b{NOT_A_COUNT}\s+(?:\w+\s+){{0,3}}?(?:cushions?|pillows?|pieces?|pcs|covers?|pads?)\b",
+    re.IGNORECASE
+)
+
+# Order numbers ("order 1042", "#1042", "no. 1042") are not counts
+ORDER_REFERENCE_RE = re.compile(r"(?:\border\s*(?:#|no\.?|number)?|#|\bno\.)\s*\d+", re.IGNORECASE)
+# Larger numbers next to "cushions" are years, prices or references; an explicit qty is still trusted
+MAX_LOOSE_QUANTITY = 50
+
+def find_quantities(text):
+    """
+    Quantities stated in `text`, ignoring the numbers of any dimensions and order references
+    """
+    text = ORDER_REFERENCE_RE.sub(" ", DIMENSION_SET_RE.sub(" ", text))
+    return [
+        explicit or loose for explicit, loose in QUANTITY_RE.findall(text)
+        if explicit or not loose.isdigit() or int(loose) <= MAX_LOOSE_QUANTITY
+    ]
+
+def compare_quantity(order_text, context_text):
+    order_quantities = re.findall(r"Quantity: (\d+)", order_text)
+    if len(order_quantities) != 1:
+        order_quantities = find_quantities(order_text)
+    context_quantities = set(find_quantities(context_text))
+    if len(set(order_quantities)) != 1 or len(context_quantities) != 1:
+        return None
+    order_quantity = int(order_quantities[0])
+    value = context_quantities.pop().lower()
+    context_quantity = NUMBER_WORDS[value] if value in NUMBER_WORDS else int(value)
+    details = f"Order: {order_quantity}; Customer: {context_quantity}"
+    if order_quantity == context_quantity:
+        return f"Quantity per type/variant: Match ({details})"
+    return f"Quantity per type/variant: Mismatch ({details})"
+
+def feature_requested(text, keyword):
+    """
+    True/False if `text` clearly asks for or declines the feature, None if silent or unclear
+    """
+    lowered = text.lower()
+    mentions = list(re.finditer(rf"\b{keyword}", lowered))
+    if not mentions:
+        return None
+    answers = set()
+    for match in mentions:
+        before = lowered[max(0, match.start() - 40):match.start()]
+        after = lowered[match.end():match.end() + 20]
+        if NEGATION_RE.search(before) or re.match(r"\w*\W+(?:no|none|not needed|not required)\b", after):
+            answers.add(False)
+        elif re.match(r"\w*\s*:\s*(?:yes|included|add)", after) or not re.match(r"\w*\s*:", after):
+            answers.add(True)
+        else:
+            return None
+    return answers.pop() if len(answers) == 1 else None
+
+def compare_feature(attribute, keyword, order_text, context_text):
+    field = order_field(order_text, attribute)
+    order_wants = feature_requested(f"{keyword}: {field}" if field is not None else order_text, keyword)
+    context_wants = feature_requested(context_text, keyword)
+    if order_wants is None:
+        return None
+    if context_wants is None:
+        # The customer never mentioned it; only an order without it is settled
+        if order_wants is False:
+            return f"{attribute}: Match (No {keyword} on the order or requested by the customer)"
+        return None
+    order_label = f"{keyword.capitalize()}" if order_wants else f"No {keyword}"
+    context_label = f"{keyword} requested" if context_wants else f"no {keyword} requested"
+    status = "Match" if order_wants == context_wants else "Mismatch"
+    return f"{attribute}: {status} (Order: {order_label}; Customer: {context_label})"
+
+def compare_color(order_text, context_text):
+    lowered = f"{order_text} {context_text}".lower()
+    if any(re.search(rf"\b{word}", lowered) for word in PATTERN_WORDS):
+        return None
+    # Shades are often named loosely ("blue" for navy), so only clearly different colors are settled
+    return compare_catalog_attribute("Color or Pattern", order_text, context_text, COLOR_CATALOG, siblings_related=True)
+
+def pre_verify(final_order_details: str, customer_context: str) -> dict:
+    """
+    Decide the attributes that can be checked mechanically.
+    Returns {attribute: result line} for the attributes resolved locally.
+    """
+    # Nothing to compare against, and attribute-level comparisons are
+    # ambiguous across several line items
+    if not customer_context.strip() or re.search(r"^Item 2:", final_order_details, re.MULTILINE):
+        return {}
+
+    fabric_field = order_field(final_order_details, "Fabric")
+    results = {
+        "Cushion Type": compare_catalog_attribute(
+            "Cushion Type", final_order_details, customer_context, CUSHION_TYPE_CATALOG
+        ),
+        "Shape": compare_catalog_attribute(
+            "Shape", order_field(final_order_details, "Shape") or final_order_details, customer_context, SHAPE_CATALOG
+        ),
+        "Dimensions": compare_dimensions(final_order_details, customer_context),
+        "Fabric": compare_catalog_attribute(
+            "Fabric", fabric_field or final_order_details, customer_context, FABRIC_CATALOG
+        ),
+        "Color or Pattern": compare_color(fabric_field or final_order_details, customer_context),
+        "Foam or Fill Type": compare_catalog_attribute(
+            "Foam or Fill Type", order_field(final_order_details, "Fill") or final_order_details, customer_context, FILL_CATALOG
+        ),
+        "Ties": compare_feature("Ties", "ties", final_order_details, customer_context),
+        "Piping": compare_feature("Piping", "piping", final_order_details, customer_context),
+        "Quantity per type/variant": compare_quantity(final_order_details, customer_context),
+    }
+    return {attribute: line for attribute, line in results.items() if line}
+
+VERIFICATION_ROW_RE = re.compile(
+    r"^(?:\d+[.)]\s*)?(?P<attribute>[A-Za-z][^:]*?)\s*:\s*"
+    r"(?P<status>mismatch|match|missing\s*/\s*unclear|missing|unclear)\b[\s:–-]*"
+    r"(?:\((?P<details>.*)\)|(?P<rest>.*))$",
+    re.IGNORECASE
+)
+
+def canonical_attribute(name: str):
+    """
+    Return the known attribute `name` refers to, or None
+    """
+    name = name.strip().lower()
+    for known in VERIFICATION_ATTRIBUTES:
+        if name == known.lower() or known.lower().startswith(name) and len(name) >= 4:
+            return known
+    return None
+
+def parse_verification_row(line: str):
+    """
+    Parse one "Attribute: Status (Details)" line into a row dict, or None
+    """
+    # Tolerate list markers and markdown emphasis around the attribute
+    match = VERIFICATION_ROW_RE.match(line.replace("*", "").replace("`", "").strip().lstrip("-• ").strip())
+    if not match:
+        return None
+    status = match.group("status").lower()
+    return {
+        "attribute": canonical_attribute(match.group("attribute")) or match.group("attribute").strip(),
+        "status": {"match": "Match", "mismatch": "Mismatch"}.get(status, "Missing/Unclear"),
+        "details": (match.group("details") or match.group("rest") or "").strip(),
+    }
+
+def parse_verification_rows(text: str) -> list:
+    """
+    Parse every verification row in a response, in the order they appear
+    """
+    rows = []
+    for line in text.splitlines():
+        row = parse_verification_row(line)
+        if row:
+            rows.append(row)
+    return rows
+
+def merge_verification_results(local_results: dict, model_text: str) -> str:
+    """
+    Combine locally resolved attributes with the model's rows in the standard order
+    """
+    model_rows = {}
+    unparsed = []
+    for line in model_text.splitlines():
+        row = parse_verification_row(line)
+        if row and row["attribute"] in VERIFICATION_ATTRIBUTES:
+            model_rows.setdefault(row["attribute"], row)
+        elif line.strip() and line.strip() != "VERIFICATION RESULTS:":
+            unparsed.append(line.strip())
+    lines = ["VERIFICATION RESULTS:"]
+    for attribute in VERIFICATION_ATTRIBUTES:
+        # Attributes nobody reported are left out so the parser can repair them
+        if attribute in local_results:
+            lines.append(local_results[attribute])
+        elif attribute in model_rows:
+            row = model_rows[attribute]
+            lines.append(f"{attribute}: {row['status']}" + (f" ({row['details']})" if row["details"] else ""))
+    # Keep whatever else the model wrote, so a failed repair loses nothing
+    return "\n".join(lines + unparsed)
+
+async def verify_with_pre_verifier(final_order_details: str, customer_context: str, on_row=None) -> str:
+    """
+    Resolve what can be checked locally and ask the model only about the rest
+    """
+    local_results = pre_verify(final_order_details, customer_context)
+    remaining = [attribute for attribute in VERIFICATION_ATTRIBUTES if attribute not in local_results]
+
+    model_on_row = None
+    if on_row is not None:
+        # Local rows are known now; the model's rows follow as they stream in
+        for line in local_results.values():
+            await on_row(parse_verification_row(line))
+
+        async def forward_model_row(row):
+            if row["attribute"] in remaining:
+                remaining.remove(row["attribute"])
+                await on_row(row)
+        model_on_row = forward_model_row
+    prompt_chars = len(final_order_details) + len(customer_context)
+
+    PRE_VERIFY_STATS["verifications"] += 1
+    PRE_VERIFY_STATS["attributes_total"] += len(VERIFICATION_ATTRIBUTES)
+    PRE_VERIFY_STATS["attributes_local"] += len(local_results)
+    logger.info(f"Pre-verifier resolved {len(local_results)}/{len(VERIFICATION_ATTRIBUTES)} attributes locally")
+
+    if not remaining:
+        PRE_VERIFY_STATS["fully_local"] += 1
+        PRE_VERIFY_STATS["llm_calls_skipped"] += 1
+        PRE_VERIFY_STATS["llm_prompt_chars_skipped"] += prompt_chars
+        return merge_verification_results(local_results, "")
+
+    start = time.perf_counter()
+    model_text = await call_standard_gpt(final_order_details, customer_context, attributes=list(remaining), on_row=model_on_row)
+    PRE_VERIFY_STATS["llm_calls"] += 1
+    PRE_VERIFY_STATS["llm_seconds"] += time.perf_counter() - start
+    PRE_VERIFY_STATS["llm_prompt_chars"] += prompt_chars
+    return merge_verification_results(local_results, model_text)
+
+# Verification results are parsed once into a typed report. A response that
+# is missing attributes or has rows in the wrong format gets one follow-up
+# request for just those attributes instead of a full re-run.
+VERIFICATION_REPAIR = os.getenv("VERIFICATION_REPAIR", "true").lower() == "true"
+PARSE_STATS = {"parsed": 0, "well_formed": 0, "repairs": 0, "repairs_succeeded": 0, "repair_seconds": 0.0}
+
+class VerificationStatus(str, Enum):
+    MATCH = "Match"
+    MISMATCH = "Mismatch"
+    MISSING_UNCLEAR = "Missing/Unclear"
+
+class AttributeResult(BaseModel):
+    attribute: str
+    status: VerificationStatus
+    details: str = ""
+
+class VerificationReport(BaseModel):
+    attributes: List[AttributeResult] = []
+    # Expected attributes that are absent or not in "Attribute: Status (Details)" form
+    malformed: List[str] = []
+    well_formed: bool = False
+    repaired: bool = False
+
+def parse_verification_result(text: str) -> VerificationReport:
+    """
+    Parse a verification response into a report in the standard attribute order
+    """
+    found = {}
+    for row in parse_verification_rows(text):
+        if row["attribute"] in VERIFICATION_ATTRIBUTES:
+            found.setdefault(row["attribute"], AttributeResult(**row))
+    malformed = [attribute for attribute in VERIFICATION_ATTRIBUTES if attribute not in found]
+    return VerificationReport(
+        attributes=[found[attribute] for attribute in VERIFICATION_ATTRIBUTES if attribute in found],
+        malformed=malformed,
+        well_formed=not malformed
+    )
+
+def render_verification_report(report: VerificationReport) -> str:
+    lines = ["VERIFICATION RESULTS:"]
+    for row in report.attributes:
+        lines.append(f"{row.attribute}: {row.status.value}" + (f" ({row.details})" if row.details else ""))
+    return "\n".join(lines)
+
+async def repair_verification_result(final_order, customer_context, text, report, on_row=None) -> VerificationReport:
+    """
+    Ask the model once to restate only the malformed attributes and merge them in
+    """
+    PARSE_STATS["repairs"] += 1
+    logger.info(f"Requesting repair of {len(report.malformed)} malformed attributes: {', '.join(report.malformed)}")
+    messages = [
+        {"role": "system", "content": (
+            "You correct the format of cushion order verification results. Reply with ONLY one line per "
+            "requested attribute, exactly as \"Attribute: Status (Details)\", where Status is one of "
+            "Match, Mismatch, Missing/Unclear."
+        )},
+        {"role": "user", "content": (
+            f"Final Order for Verification:\n{final_order}\n\n"
+            + (f"Customer Communication Context:\n{customer_context}\n\n" if customer_context else "")
+            + f"Earlier verification output:\n{text}\n\n"
+            + f"These attributes are missing or malformed: {', '.join(report.malformed)}. "
+            + "Return one line for each of them and nothing else."
+        )}
+    ]
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {"model": GPT_MODEL, "messages": messages, "temperature": 0}
+
+    start = time.perf_counter()
+    try:
+        response = await send_hedged_request("openai_chat", "POST", GPT_ENDPOINT, GPT_HEDGE_AFTER, headers=headers, json=payload)
+        response.raise_for_status()
+        response_data = response.json()
+        record_token_usage(GPT_MODEL, response_data.get("usage"))
+        repair_text = response_data["choices"][0]["message"]["content"]
+    except Exception as e:
+        logger.warning(f"Verification repair request failed: {str(e)}")
+        return report
+    finally:
+        PARSE_STATS["repair_seconds"] += time.perf_counter() - start
+
+    repaired = {row.attribute: row for row in report.attributes}
+    for row in parse_verification_result(repair_text).attributes:
+        if row.attribute in report.malformed:
+            repaired[row.attribute] = row
+            if on_row is not None:
+                await on_row(row.model_dump(mode="json"))
+    malformed = [attribute for attribute in VERIFICATION_ATTRIBUTES if attribute not in repaired]
+    if not malformed:
+        PARSE_STATS["repairs_succeeded"] += 1
+    return VerificationReport(
+        attributes=[repaired[attribute] for attribute in VERIFICATION_ATTRIBUTES if attribute in repaired],
+        malformed=malformed,
+        well_formed=not malformed,
+        repaired=True
+    )
+
+# Transcripts are cached on disk keyed by a hash of the audio bytes and the
+# model, so re-submitting the same recording skips the Whisper upload.
+TRANSCRIPT_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "whisper_seconds_saved": 0.0}
+
+def transcript_cache_key(audio_hash: str, model: str) -> str:
+    return hashlib.sha256(f"{model}:{audio_hash}".encode("utf-8")).hexdigest()
+
+def read_cached_transcript(key: str):
+    """
+    Return the cached transcript entry for `key`, or None
+    """
+    path = os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Touch the entry so eviction drops the least recently used transcripts first
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+def write_cached_transcript(key: str, entry: dict):
+    """
+    Store a transcript entry and evict old entries beyond the size cap
+    """
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+    
+    files = []
+    for name in os.listdir(TRANSCRIPT_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        file_path = os.path.join(TRANSCRIPT_CACHE_DIR, name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, file_path))
+    
+    total = sum(size for _, size, _ in files)
+    max_bytes = TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024
+    for _, size, file_path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+        except OSError:
+            continue
+        total -= size
+        TRANSCRIPT_CACHE_STATS["evictions"] += 1
+
+def hash_upload(file, chunk_size=1024 * 1024) -> str:
+    """
+    Hash an uploaded file in chunks without reading it into memory
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+def copy_upload(file, path, chunk_size=1024 * 1024):
+    """
+    Copy an uploaded file to `path` in chunks
+    """
+    file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out, chunk_size)
+    file.seek(0)
+
+async def run_ffmpeg_tool(*args) -> str:
+    """
+    Run ffmpeg or ffprobe and return its combined output
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+        raise
+    if process.returncode != 0:
+        raise Exception(f"{os.path.basename(args[0])} failed: {stderr.decode('utf-8', 'replace')[-500:]}")
+    return stdout.decode("utf-8", "replace") + stderr.decode("utf-8", "replace")
+
+async def probe_audio_duration(path: str) -> float:
+    output = await run_ffmpeg_tool(
+        FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", path
+    )
+    return float(output.split()[0])
+
+async def detect_silences(path: str, noise_db=-35, min_duration=0.4):
+    """
+    Return the midpoints (in seconds) of the silent stretches in an audio file
+    """
+    output = await run_ffmpeg_tool(
+        FFMPEG_PATH, "-hide_banner", "-nostats", "-i", path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_duration}", "-f", "null", "-"
+    )
+    starts = [float(x) for x in re.findall(r"silence_start: (-?[\d.]+)", output)]
+    ends = [float(x) for x in re.findall(r"silence_end: ([\d.]+)", output)]
+    return [(max(start, 0.0) + end) / 2 for start, end in zip(starts, ends)]
+
+def plan_audio_chunks(duration, silences, chunk_seconds, overlap):
+    """
+    Split [0, duration] into chunks of at most `chunk_seconds`, cutting at a
+    silence in the last third of each chunk when there is one. Each chunk is
+    widened by `overlap` seconds on both sides so no word is lost at a cut.
+    Returns a list of (start, end) tuples.
+    """
+    cuts = [0.0]
+    while duration - cuts[-1] > chunk_seconds:
+        start = cuts[-1]
+        remaining = duration - start
+        # Split the last stretch evenly rather than leaving a tiny final chunk
+        target = chunk_seconds if remaining > chunk_seconds * 4 / 3 else remaining / 2
+        window = [mid for mid in silences if start + target * 2 / 3 <= mid <= start + target]
+        cuts.append(max(window) if window else start + target)
+    cuts.append(duration)
+    return [
+        (max(0.0, start - overlap), min(duration, end + overlap))
+        for start, end in zip(cuts, cuts[1:])
+    ]
+
+async def extract_audio_chunk(source: str, path: str, start: float, end: float):
+    # Re-encode to 16 kHz mono so each chunk stays far below the Whisper upload limit
+    await run_ffmpeg_tool(
+        FFMPEG_PATH, "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", source,
+        "-vn", "-ac", "1", "-ar", "16000", "-b:a", "64k", path
+    )
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+# Fast speech; bounds how many words two consecutive chunks can share
+TRANSCRIPT_WORDS_PER_SECOND = 3
+
+def stitch_transcripts(parts, overlap_words=12, min_match_words=2):
+    """
+    Join chunk transcripts, dropping the words repeated in the overlaps.
+    Only the last `overlap_words` words of one chunk and the first of the
+    next can hold the overlap. Of the runs of at least `min_match_words`
+    words they share there, the one closest to the cut is kept once; if
+    there is none the chunks are simply joined.
+    """
+    words = []
+    for part in parts:
+        next_words = part.split()
+        if not words:
+            words = next_words
+            continue
+        tail = [_normalize_word(w) for w in words[-overlap_words:]]
+        head = [_normalize_word(w) for w in next_words[:overlap_words]]
+        best = None  # (words of tail after the run + words of head before it, -size, tail start, head start)
+        for a in range(len(tail)):
+            for b in range(len(head)):
+                size = 0
+                while a + size < len(tail) and b + size < len(head) and tail[a + size] == head[b + size]:
+                    size += 1
+                if size >= min_match_words:
+                    candidate = (len(tail) - a - size + b, -size, a, b)
+                    best = min(best, candidate) if best else candidate
+        if best:
+            _, negative_size, a, b = best
+            size = -negative_size
+            words = words[:len(words) - len(tail) + a + size] + next_words[b + size:]
+        else:
+            words = words + next_words
+    return " ".join(words)
+
+async def transcribe_file(filename, file, content_type, file_type) -> str:
+    """
+    Upload a single audio file to the Whisper API and return its transcript
+    """
+    files = {"file": (filename, file, content_type)}
+    data = {"model": WHISPER_MODEL}
+    
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}"
+    }
+    
+    # Whisper has its own, much longer timeout (WHISPER_TIMEOUT)
+    response = await send_request("whisper", "POST", WHISPER_ENDPOINT, headers=headers, files=files, data=data)
+    
+    if not response.is_success:
+        logger.error(f"{file_type} Whisper transcription failed: {response.status_code} - {response.text}")
+        raise Exception(f"{file_type} Whisper transcription failed: {response.status_code} - {response.text}")
+    return response.json().get("text", "")
+
+async def transcribe_in_chunks(audio_file, file_type) -> str:
+    """
+    Split a long recording on silences and transcribe the chunks in parallel,
+    at most TRANSCRIBE_CONCURRENCY at a time
+    """
+    with tempfile.TemporaryDirectory(prefix="transcribe_") as workdir:
+        extension = os.path.splitext(audio_file.filename or "")[1]
+        source = os.path.join(workdir, f"source{extension}")
+        await asyncio.to_thread(copy_upload, audio_file.file, source)
+        
+        duration = await probe_audio_duration(source)
+        silences = await detect_silences(source)
+        chunks = plan_audio_chunks(duration, silences, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP)
+        
+        if len(chunks) == 1 and audio_file.size <= WHISPER_MAX_UPLOAD_MB * 1024 * 1024:
+            audio_file.file.seek(0)
+            return await transcribe_file(audio_file.filename, audio_file.file, audio_file.content_type, file_type)
+        
+        logger.info(f"Transcribing {file_type} audio ({duration:.0f} s) in {len(chunks)} chunks")
+        semaphore = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
+
+        async def transcribe_chunk(index, start, end):
+            path = os.path.join(workdir, f"chunk_{index}.mp3")
+            async with semaphore:
+                await extract_audio_chunk(source, path, start, end)
+                with open(path, "rb") as f:
+                    return await transcribe_file(f"chunk_{index}.mp3", f, "audio/mpeg", file_type)
+
+        try:
+            results, _ = await run_stages({
+                index: transcribe_chunk(index, start, end)
+                for index, (start, end) in enumerate(chunks)
+            })
+        except StageError as e:
+            raise e.error
+    
+    # Consecutive chunks share twice the overlap around each cut
+    overlap_words = max(2, round(2 * TRANSCRIBE_CHUNK_OVERLAP * TRANSCRIPT_WORDS_PER_SECOND))
+    return stitch_transcripts([results[index] for index in range(len(chunks))], overlap_words=overlap_words)
+
 async def process_audio_file(audio_file, file_type):
     """
     Process audio file and return transcript using OpenAI Whisper API
@@ -327,50 +2508,113 @@ async def process_audio_file(audio_file, file_type):
     
     logger.info(f"Processing {file_type} audio file: {audio_file.filename}, size: {audio_file.size}")
     
-    # Read the audio file ONCE and store the bytes
+    # The upload is already spooled to a temporary file; never read it into memory
     try:
-        audio_bytes = await audio_file.read()
-        file_size_mb = len(audio_bytes) / (1024 * 1024)
-        logger.info(f"Audio file read successfully, size: {len(audio_bytes)} bytes ({file_size_mb:.1f} MB)")
+        file_size_mb = audio_file.size / (1024 * 1024)
         
         # Check file size limits for Whisper API
-        if file_size_mb > 25:
-            raise Exception(f"Audio file too large ({file_size_mb:.1f} MB). Whisper API supports files up to 25 MB.")
+        if file_size_mb > MAX_AUDIO_UPLOAD_MB:
+            raise Exception(f"Audio file too large ({file_size_mb:.1f} MB). Audio uploads are limited to {MAX_AUDIO_UPLOAD_MB:g} MB.")
+        chunked = bool(FFMPEG_PATH and FFPROBE_PATH) and file_size_mb > TRANSCRIBE_CHUNK_MIN_MB
+        if not chunked and file_size_mb > WHISPER_MAX_UPLOAD_MB:
+            raise Exception(f"Audio file too large ({file_size_mb:.1f} MB). Whisper API supports files up to {WHISPER_MAX_UPLOAD_MB} MB.")
+        
+        audio_hash = await asyncio.to_thread(hash_upload, audio_file.file)
+        logger.info(f"Audio file spooled successfully, size: {audio_file.size} bytes ({file_size_mb:.1f} MB)")
             
     except Exception as e:
         logger.error(f"Error reading {file_type} audio file: {str(e)}")
         raise Exception(f"Error reading {file_type} audio file: {str(e)}")
     
+    cache_key = transcript_cache_key(audio_hash, WHISPER_MODEL)
+    cached = await asyncio.to_thread(read_cached_transcript, cache_key)
+    if cached is not None:
+        TRANSCRIPT_CACHE_STATS["hits"] += 1
+        TRANSCRIPT_CACHE_STATS["whisper_seconds_saved"] += cached.get("whisper_seconds", 0.0)
+        logger.info(f"{file_type} transcript served from cache, length: {len(cached['text'])}")
+        return cached["text"]
+    TRANSCRIPT_CACHE_STATS["misses"] += 1
+    
     # Use OpenAI Whisper API for transcription
     try:
         logger.info(f"Transcribing {file_type} audio with OpenAI Whisper API")
         
-        # Prepare the file for Whisper API
-        files = {"file": (audio_file.filename, audio_bytes, audio_file.content_type)}
-        data = {"model": "whisper-1"}  # Use the latest Whisper model
-        
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}"
-        }
-        
-        # Whisper API has much longer timeout limits and handles large files better
-        response = requests.post(WHISPER_ENDPOINT, headers=headers, files=files, data=data, timeout=600)  # 10 minutes
-        
-        if response.ok:
-            transcript = response.json().get("text", "")
-            logger.info(f"{file_type} Whisper transcription successful, length: {len(transcript)}")
-            return transcript
+        whisper_start = time.perf_counter()
+        if chunked:
+            transcript = await transcribe_in_chunks(audio_file, file_type)
         else:
-            logger.error(f"{file_type} Whisper transcription failed: {response.status_code} - {response.text}")
-            raise Exception(f"{file_type} Whisper transcription failed: {response.status_code} - {response.text}")
+            # Stream the spooled file to the Whisper API
+            audio_file.file.seek(0)
+            transcript = await transcribe_file(audio_file.filename, audio_file.file, audio_file.content_type, file_type)
+        whisper_seconds = time.perf_counter() - whisper_start
+        
+        logger.info(f"{file_type} Whisper transcription successful, length: {len(transcript)}")
+        try:
+            await asyncio.to_thread(write_cached_transcript, cache_key, {
+                "text": transcript,
+                "model": WHISPER_MODEL,
+                "whisper_seconds": whisper_seconds,
+                "created": time.time(),
+            })
+        except OSError as e:
+            logger.warning(f"Could not cache {file_type} transcript: {str(e)}")
+        return transcript
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"{file_type} Whisper transcription timed out after 10 minutes")
         raise Exception(f"{file_type} Whisper transcription timed out. The audio file may be too large or complex. Please try with a shorter audio file.")
     except Exception as e:
         logger.error(f"Error with {file_type} Whisper transcription: {str(e)}")
         raise
 
+# run_stages names -> stage labels used in metrics
+STAGE_METRIC_NAMES = {"shopify": "fetch_shopify_order", "audio": "process_audio_file"}
+
+class StageError(Exception):
+    """
+    Raised by run_stages when one of the concurrent stages fails
+    """
+    def __init__(self, stage, error):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+async def run_stages(stages):
+    """
+    Run independent pipeline stages concurrently and join them.
+
+    `stages` maps a stage name to a coroutine. Returns a tuple of
+    (results, timings) keyed by stage name, with timings in seconds.
+    If any stage fails, the remaining stages are cancelled and a
+    StageError naming the failed stage is raised.
+    """
+    timings = {}
+
+    async def timed(name, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    tasks = {name: asyncio.create_task(timed(name, coro)) for name, coro in stages.items()}
+    try:
+        if tasks:
+            await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        for name, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception():
+                raise StageError(name, task.exception())
+    finally:
+        # Cancel whatever is still running (a sibling failed or the request
+        # itself was cancelled) and wait for the cancellations to settle
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    results = {name: task.result() for name, task in tasks.items()}
+    return results, timings
+
 @app.get("/", response_class=HTMLResponse)
 async def read_form(request: Request):
     logger.info(f"GET / - Serving main page")
@@ -382,73 +2626,316 @@ async def get_shopify_order(order_id: str):
     Get Shopify order data from your endpoint
     """
     try:
-        order_data = fetch_shopify_order(order_id)
+        order_data = await fetch_shopify_order(order_id)
         return JSONResponse(content={"order": order_data})
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
-@app.post("/submit", response_class=HTMLResponse)
-async def handle_form(
-    request: Request,
-    order_source: str = Form(...),  # Required field - "shopify" or "manual"
-    final_order: str = Form(""),  # Optional when using Shopify
-    shopify_order_id: str = Form(""),  # Optional when using manual input
-    customer_chat_text: str = Form(""),
-    customer_audio_file: UploadFile = File(None)
-):
-    logger.info("POST /submit - Form submission received")
-    logger.info(f"Order source: {order_source}")
-    logger.info(f"Final order provided: {'Yes' if final_order else 'No'}")
-    logger.info(f"Shopify order ID provided: {'Yes' if shopify_order_id else 'No'}")
-    logger.info(f"Customer chat text provided: {'Yes' if customer_chat_text else 'No'}")
-    logger.info(f"Customer audio file provided: {'Yes' if customer_audio_file else 'No'}")
+def verify_shopify_webhook(body: bytes, hmac_header: str) -> bool:
+    """
+    Verify the HMAC signature Shopify sends with every webhook
+    """
+    if not SHOPIFY_WEBHOOK_SECRET or not hmac_header:
+        return False
+    digest = hmac.new(SHOPIFY_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode("utf-8"), hmac_header)
+
+@app.post("/shopify/webhook/orders")
+async def shopify_order_webhook(request: Request):
+    """
+    Receive Shopify order webhooks and keep the order cache fresh
+    """
+    topic = request.headers.get("X-Shopify-Topic", "")
+    logger.info(f"Received Shopify webhook: {topic}")
+    
+    body = await request.body()
+    if not verify_shopify_webhook(body, request.headers.get("X-Shopify-Hmac-Sha256", "")):
+        logger.warning("Invalid webhook signature")
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    try:
+        order_data = json.loads(body)
+        order_id = str(order_data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid order payload")
     
-    # Validate order source and get final order details
-    final_order_details = ""
+    if topic == "orders/delete":
+        invalidate_cached_shopify_order(order_id)
+    else:
+        update_cached_shopify_order(order_data)
+    
+    logger.info(f"Successfully processed webhook order: {order_id}")
+    return JSONResponse(content={"status": "ok"})
+
+@app.get("/shopify/webhooks/status")
+async def shopify_webhook_status():
+    """
+    Webhook configuration status, cached orders and cache metrics
+    """
+    return JSONResponse(content={
+        "webhook_secret_configured": bool(SHOPIFY_WEBHOOK_SECRET),
+        "cached_orders": len(shopify_order_cache),
+        "order_ids": shopify_order_cache.keys(),
+        "cache": {
+            **shopify_order_cache.stats,
+            **SHOPIFY_CACHE_STATS,
+            "size": len(shopify_order_cache),
+            "max_size": shopify_order_cache.maxsize,
+            "ttl_seconds": shopify_order_cache.ttl,
+        },
+    })
+
+@app.get("/results/stats")
+async def get_result_cache_stats():
+    """
+    Verification result cache hit rate
+    """
+    lookups = RESULT_CACHE_STATS["hits"] + RESULT_CACHE_STATS["misses"]
+    return JSONResponse(content={
+        **RESULT_CACHE_STATS,
+        "hit_rate": RESULT_CACHE_STATS["hits"] / lookups if lookups else 0,
+        "prompt_version": PROMPT_VERSION,
+        "parser": {
+            **PARSE_STATS,
+            "well_formed_rate": PARSE_STATS["well_formed"] / PARSE_STATS["parsed"] if PARSE_STATS["parsed"] else 0,
+        },
+    })
+
+@app.get("/preverify/stats")
+async def get_pre_verify_stats():
+    """
+    Attributes resolved locally and model calls avoided by the pre-verifier
+    """
+    stats = PRE_VERIFY_STATS
+    average_llm_seconds = stats["llm_seconds"] / stats["llm_calls"] if stats["llm_calls"] else 0
+    return JSONResponse(content={
+        "enabled": PRE_VERIFY,
+        **stats,
+        "local_attribute_rate": stats["attributes_local"] / stats["attributes_total"] if stats["attributes_total"] else 0,
+        "fully_local_rate": stats["fully_local"] / stats["verifications"] if stats["verifications"] else 0,
+        "estimated_seconds_saved": stats["llm_calls_skipped"] * average_llm_seconds,
+        # Roughly four characters per token, plus the fixed system prompt
+        "estimated_tokens_saved": stats["llm_prompt_chars_skipped"] // 4 + stats["llm_calls_skipped"] * 450,
+    })
+
+@app.get("/transcripts/stats")
+async def get_transcript_stats():
+    """
+    Transcript cache hit rate and Whisper time saved
+    """
+    lookups = TRANSCRIPT_CACHE_STATS["hits"] + TRANSCRIPT_CACHE_STATS["misses"]
+    return JSONResponse(content={
+        **TRANSCRIPT_CACHE_STATS,
+        "hit_rate": TRANSCRIPT_CACHE_STATS["hits"] / lookups if lookups else 0,
+    })
+
+@app.get("/assistant/stats")
+async def get_assistant_stats():
+    """
+    Round-trip and thread cleanup counters for the custom GPT assistant
+    """
+    verifications = ASSISTANT_STATS["verifications"]
+    return JSONResponse(content={
+        **ASSISTANT_STATS,
+        "round_trips_per_verification": ASSISTANT_STATS["round_trips"] / verifications if verifications else 0,
+        "pending_thread_deletions": len(assistant_threads),
+    })
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Under gunicorn, sum the counters and histograms of every worker. The
+        # in-process stats dicts are left out here; each /stats endpoint shows
+        # the numbers of the worker that answers it.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/outbound/stats")
+async def get_outbound_stats():
+    """
+    Latency percentiles, retries and circuit breaker state per outbound endpoint
+    """
+    endpoints = {}
+    for endpoint, stats in OUTBOUND_STATS.items():
+        breaker = OUTBOUND_POLICIES[endpoint].get("breaker")
+        endpoints[endpoint] = {
+            **{name: value for name, value in stats.items() if name != "latencies"},
+            "latency_seconds": latency_percentiles(stats["latencies"]),
+            "circuit": {"state": breaker.state, "times_opened": breaker.times_opened} if breaker else None,
+        }
+    return JSONResponse(content=endpoints)
+
+@app.get("/ratelimit/stats")
+async def get_rate_limit_stats():
+    """
+    OpenAI rate limit scheduler capacity, queue length and waits
+    """
+    schedulers = {}
+    for scheduler in [openai_scheduler, whisper_scheduler]:
+        scheduler.refill()
+        schedulers[scheduler.name] = {
+            **scheduler.stats,
+            "queued": sum(not waiter[3].done() for waiter in scheduler.waiters),
+            "requests_per_minute": scheduler.rpm,
+            "tokens_per_minute": scheduler.tpm,
+            "available_requests": scheduler.requests,
+            "available_tokens": scheduler.tokens,
+        }
+    return JSONResponse(content=schedulers)
+
+# Verification results are deterministic for the same inputs (temperature 0),
+# so they are cached in SQLite keyed by the normalized order, the customer
+# context, the model and the prompt version. Bump PROMPT_VERSION whenever a
+# prompt changes so old results are not reused.
+PROMPT_VERSION = "1"
+RESULT_CACHE_DB_PATH = os.getenv("RESULT_CACHE_DB_PATH", "results.db")
+RESULT_CACHE_TTL_HOURS = float(os.getenv("RESULT_CACHE_TTL_HOURS", "168"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "20"))
+RESULT_CACHE_STATS = {"hits": 0, "misses": 0, "bypassed": 0, "expirations": 0, "evictions": 0}
+
+def verification_model() -> str:
+    if USE_CUSTOM_GPT:
+        return f"assistant:{CUSTOM_ASSISTANT_ID}"
+    return f"{GPT_MODEL}+preverify" if PRE_VERIFY else GPT_MODEL
+
+def result_cache_key(final_order_details: str, customer_context: str, model: str) -> str:
+    def normalize(text):
+        return " ".join(text.split())
+    material = "\x1f".join([normalize(final_order_details), normalize(customer_context), model, PROMPT_VERSION])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def result_cache_db():
+    return sqlite3.connect(RESULT_CACHE_DB_PATH, timeout=30)
+
+def init_result_cache():
+    with result_cache_db() as db:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+
+def read_cached_result(key: str):
+    """
+    Return the cached verification result for `key`, or None
+    """
+    now = time.time()
+    with result_cache_db() as db:
+        row = db.execute("SELECT result, created FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now - RESULT_CACHE_TTL_HOURS * 3600:
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            RESULT_CACHE_STATS["expirations"] += 1
+            return None
+        db.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+def write_cached_result(key: str, result: str):
+    """
+    Store a verification result and evict the least recently used results beyond the size cap
+    """
+    now = time.time()
+    size = len(result.encode("utf-8"))
+    with result_cache_db() as db:
+        db.execute(
+            "INSERT OR REPLACE INTO results (key, result, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, result, size, now, now)
+        )
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        max_bytes = RESULT_CACHE_MAX_MB * 1024 * 1024
+        if total <= max_bytes:
+            return
+        for old_key, old_size in db.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+            if total <= max_bytes:
+                break
+            db.execute("DELETE FROM results WHERE key = ?", (old_key,))
+            total -= old_size
+            RESULT_CACHE_STATS["evictions"] += 1
+
+class VerificationError(Exception):
+    """
+    A verification that cannot go ahead, with a message meant for the user
+    """
+
+async def run_verification(
+    order_source,
+    final_order,
+    shopify_order_id,
+    customer_chat_text,
+    customer_audio_file,
+    on_progress=None,
+    bypass_cache=False,
+    on_row=None
+):
+    """
+    Run the verification pipeline and return the template context for its result.
+    Raises VerificationError for invalid input or a failed input stage.
+    `on_progress` is awaited with the name of each stage as it starts.
+    `bypass_cache` skips the result cache lookup (a fresh result is still stored).
+    `on_row` is awaited with each verification row as the standard GPT path streams it.
+    """
+    async def progress(stage):
+        if on_progress:
+            await on_progress(stage)
+
+    verification_start = time.perf_counter()
+    # Validate inputs before starting any network calls
     if order_source == "shopify":
         if not shopify_order_id or not shopify_order_id.strip():
             logger.warning("No Shopify order ID provided")
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "error": "Shopify order ID is required when selecting Shopify as order source."
-            })
-        
-        try:
-            final_order_details = fetch_shopify_order(shopify_order_id)
-            logger.info(f"Successfully fetched Shopify order details, length: {len(final_order_details)}")
-        except Exception as e:
-            logger.error(f"Error fetching Shopify order: {str(e)}")
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "error": f"Error fetching Shopify order: {str(e)}"
-            })
+            VERIFICATION_ERRORS.labels("validation").inc()
+            raise VerificationError("Shopify order ID is required when selecting Shopify as order source.")
     else:  # manual input
         if not final_order or not final_order.strip():
             logger.warning("No final order provided")
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "error": "Final order for verification is required when using manual input."
-            })
-        final_order_details = final_order
-    
+            VERIFICATION_ERRORS.labels("validation").inc()
+            raise VerificationError("Final order for verification is required when using manual input.")
+
     # Check if at least one customer communication method is provided
     if not customer_chat_text.strip() and not customer_audio_file:
         logger.warning("No customer communication provided")
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "error": "You must provide either customer communication text or audio file (or both)."
-        })
+        VERIFICATION_ERRORS.labels("validation").inc()
+        raise VerificationError("You must provide either customer communication text or audio file (or both).")
     
-    # Process customer audio if provided
-    customer_transcript = ""
+    # The Shopify fetch and the audio transcription are independent, so run
+    # them concurrently and join before verification
+    stages = {}
+    if order_source == "shopify":
+        stages["shopify"] = fetch_shopify_order(shopify_order_id)
     if customer_audio_file:
-        try:
-            customer_transcript = await process_audio_file(customer_audio_file, "customer")
-        except Exception as e:
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "error": f"Error processing customer audio file: {str(e)}"
-            })
+        stages["audio"] = process_audio_file(customer_audio_file, "customer")
+    
+    await progress("gathering_inputs")
+    try:
+        stage_results, stage_timings = await run_stages(stages)
+    except StageError as e:
+        VERIFICATION_ERRORS.labels(STAGE_METRIC_NAMES[e.stage]).inc()
+        if e.stage == "shopify":
+            logger.error(f"Error fetching Shopify order: {str(e)}")
+            raise VerificationError(f"Error fetching Shopify order: {str(e)}")
+        raise VerificationError(f"Error processing customer audio file: {str(e)}")
+    
+    for stage, elapsed in stage_timings.items():
+        STAGE_SECONDS.labels(STAGE_METRIC_NAMES[stage]).observe(elapsed)
+
+    if order_source == "shopify":
+        final_order_details = stage_results["shopify"]
+        logger.info(f"Successfully fetched Shopify order details, length: {len(final_order_details)}")
+    else:
+        final_order_details = final_order
+    customer_transcript = stage_results.get("audio", "")
     
     # Combine customer context
     customer_context = ""
@@ -464,35 +2951,661 @@ async def handle_form(
     
     if not OPENAI_API_KEY:
         logger.error("OpenAI API key not configured")
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "error": "OpenAI API key not configured."
-        })
+        raise VerificationError("OpenAI API key not configured.")
 
-    try:
-        if USE_CUSTOM_GPT:
-            logger.info("Calling custom GPT assistant...")
-            gpt_text = call_custom_gpt_assistant(final_order_details, customer_context)
-            logger.info(f"Custom GPT assistant response successful, length: {len(gpt_text)}")
+    await progress("verifying")
+    gpt_start = time.perf_counter()
+    cache_key = result_cache_key(final_order_details, customer_context, verification_model())
+    gpt_text = None
+    if bypass_cache:
+        RESULT_CACHE_STATS["bypassed"] += 1
+    else:
+        try:
+            gpt_text = await asyncio.to_thread(read_cached_result, cache_key)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache lookup failed: {str(e)}")
+        if gpt_text is not None:
+            RESULT_CACHE_STATS["hits"] += 1
+            logger.info("Verification result served from cache")
         else:
-            logger.info("Calling standard GPT-4...")
-            gpt_text = call_standard_gpt(final_order_details, customer_context)
-            logger.info(f"Standard GPT-4 response successful, length: {len(gpt_text)}")
-    except Exception as e:
-        logger.error(f"Error calling GPT API: {str(e)}", exc_info=True)
-        gpt_text = f"Error calling GPT API: {str(e)}"
+            RESULT_CACHE_STATS["misses"] += 1
+    result_cached = gpt_text is not None
+    report = None
+    
+    if not result_cached:
+        try:
+            if USE_CUSTOM_GPT:
+                logger.info("Calling custom GPT assistant...")
+                gpt_text = await call_custom_gpt_assistant(final_order_details, customer_context)
+                logger.info(f"Custom GPT assistant response successful, length: {len(gpt_text)}")
+            else:
+                logger.info("Calling standard GPT-4...")
+                if PRE_VERIFY:
+                    gpt_text = await verify_with_pre_verifier(final_order_details, customer_context, on_row=on_row)
+                else:
+                    gpt_text = await call_standard_gpt(final_order_details, customer_context, on_row=on_row)
+                logger.info(f"Standard GPT-4 response successful, length: {len(gpt_text)}")
+            report = parse_verification_result(gpt_text)
+            if not report.well_formed and VERIFICATION_REPAIR:
+                report = await repair_verification_result(final_order_details, customer_context, gpt_text, report, on_row)
+                # A failed repair keeps the model's own text rather than just the rows that parsed
+                if report.repaired:
+                    gpt_text = render_verification_report(report)
+            # Incomplete results are not reused, so the next run gets another chance
+            if report.well_formed:
+                try:
+                    await asyncio.to_thread(write_cached_result, cache_key, gpt_text)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not cache verification result: {str(e)}")
+        except Exception as e:
+            if is_openai_rate_limited(e):
+                # Not a verification result; fail so the order can be retried
+                logger.error(f"OpenAI rate limit prevented verification: {str(e)}")
+                VERIFICATION_ERRORS.labels("rate_limit").inc()
+                raise VerificationError("OpenAI is rate limiting requests right now. Please try again in a minute.")
+            logger.error(f"Error calling GPT API: {str(e)}", exc_info=True)
+            VERIFICATION_ERRORS.labels("gpt").inc()
+            gpt_text = f"Error calling GPT API: {str(e)}"
+            report = None
+    if report is None:
+        report = parse_verification_result(gpt_text)
+    PARSE_STATS["parsed"] += 1
+    PARSE_STATS["well_formed"] += report.well_formed
+    stage_timings["gpt"] = time.perf_counter() - gpt_start
+    # Cache hits are counted by the result cache, not timed as model calls
+    if not result_cached:
+        STAGE_SECONDS.labels("gpt").observe(stage_timings["gpt"])
+    STAGE_SECONDS.labels("total").observe(time.perf_counter() - verification_start)
+    logger.info("Stage timings: " + ", ".join(f"{name}={elapsed:.2f}s" for name, elapsed in stage_timings.items()))
 
-    logger.info("Rendering response template...")
-    return templates.TemplateResponse("index.html", {
-        "request": request,
+    return {
         "result": gpt_text,
+        "result_cached": result_cached,
+        "report": report.model_dump(mode="json"),
+        "rows": [row.model_dump(mode="json") for row in report.attributes],
         "order_source": order_source,
         "final_order": final_order_details,
         "shopify_order_id": shopify_order_id,
         "customer_chat_text": customer_chat_text,
         "customer_transcript": customer_transcript
+    }
+
+# Background verification jobs. Jobs are stored in SQLite so queued work
+# survives a restart, and are run by a bounded pool of workers.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOBS_UPLOAD_DIR = os.getenv("JOBS_UPLOAD_DIR", ".job_uploads")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = 1.0  # seconds
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+# A running job whose worker has not reported for this long is requeued, so
+# jobs of a crashed or restarted worker process are picked up by another
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+job_available = asyncio.Event()
+last_job_prune = 0.0
+last_job_lease_check = 0.0
+# Event streams waiting on a job; woken when the job changes in this process
+job_listeners = {}
+
+def notify_job(job_id):
+    for listener in job_listeners.get(job_id, []):
+        listener.set()
+
+def jobs_db():
+    connection = sqlite3.connect(JOBS_DB_PATH, timeout=30)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+def init_jobs_db():
+    """
+    Create the jobs table and requeue jobs that were running when the process stopped.
+    With several worker processes only jobs whose lease has lapsed are requeued;
+    the others may still be running in another worker.
+    """
+    with jobs_db() as db:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                result_rows TEXT,
+                heartbeat REAL
+            )
+        """)
+        columns = [column["name"] for column in db.execute("PRAGMA table_info(jobs)")]
+        if "result_rows" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN result_rows TEXT")
+        if "heartbeat" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+    requeue_stale_jobs(JOB_LEASE_SECONDS if WEB_CONCURRENCY > 1 else 0)
+
+def requeue_stale_jobs(lease_seconds):
+    """
+    Requeue running jobs that have not sent a heartbeat for `lease_seconds`
+    """
+    with jobs_db() as db:
+        requeued = db.execute("""
+            UPDATE jobs SET status = 'queued', stage = 'queued', started = NULL, result_rows = NULL, heartbeat = NULL
+            WHERE status = 'running' AND COALESCE(heartbeat, started, 0) <= ?
+        """, (time.time() - lease_seconds,)).rowcount
+    if requeued:
+        logger.info(f"Requeued {requeued} interrupted verification jobs")
+
+def insert_job(job_id, params):
+    with jobs_db() as db:
+        db.execute(
+            "INSERT INTO jobs (id, status, stage, params, created) VALUES (?, 'queued', 'queued', ?, ?)",
+            (job_id, json.dumps(params), time.time())
+        )
+
+def claim_next_job():
+    """
+    Atomically mark the oldest queued job as running and return it
+    """
+    with jobs_db() as db:
+        return db.execute("""
+            UPDATE jobs SET status = 'running', started = ?, heartbeat = ?
+            WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1)
+            RETURNING *
+        """, (time.time(), time.time())).fetchone()
+
+def update_job(job_id, **fields):
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with jobs_db() as db:
+        db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+def get_job(job_id):
+    with jobs_db() as db:
+        return db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+def prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_HOURS * 3600
+    with jobs_db() as db:
+        db.execute("DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished < ?", (cutoff,))
+
+def job_stats():
+    """
+    Queue depth, and wait and run times for jobs finished in the last hour
+    """
+    now = time.time()
+    with jobs_db() as db:
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        oldest_queued = db.execute("SELECT MIN(created) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        timing = db.execute("""
+            SELECT COUNT(*), AVG(started - created), MAX(started - created), AVG(finished - started), MAX(finished - started)
+            FROM jobs WHERE finished >= ?
+        """, (now - 3600,)).fetchone()
+    return {
+        "queue_depth": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "workers": JOB_WORKERS,
+        "oldest_queued_seconds": now - oldest_queued if oldest_queued else 0,
+        "last_hour": {
+            "finished": timing[0],
+            "avg_wait_seconds": timing[1] or 0,
+            "max_wait_seconds": timing[2] or 0,
+            "avg_run_seconds": timing[3] or 0,
+            "max_run_seconds": timing[4] or 0,
+        },
+    }
+
+def job_to_dict(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "rows": json.loads(job["result_rows"]) if job["result_rows"] else [],
+        "error": job["error"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"],
+    }
+
+async def execute_job(job):
+    """
+    Run one claimed verification job and store its outcome
+    """
+    job_id = job["id"]
+    params = json.loads(job["params"])
+    audio = params.pop("audio", None)
+    # Log under the trace ID of the request that queued the job
+    trace_token = trace_id_var.set(params.pop("trace_id", None) or job_id[:16])
+    logger.info(f"Running verification job {job_id}")
+    
+    async def on_progress(stage):
+        await asyncio.to_thread(update_job, job_id, stage=stage)
+        notify_job(job_id)
+
+    async def send_heartbeats():
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 4)
+            await asyncio.to_thread(update_job, job_id, heartbeat=time.time())
+
+    heartbeat_task = asyncio.create_task(send_heartbeats())
+    rows = []
+
+    async def on_row(row):
+        rows.append(row)
+        await asyncio.to_thread(update_job, job_id, result_rows=json.dumps(rows))
+        notify_job(job_id)
+    
+    audio_file = None
+    finished = False
+    try:
+        if audio:
+            audio_file = UploadFile(
+                file=open(audio["path"], "rb"),
+                size=audio["size"],
+                filename=audio["filename"],
+                headers=Headers({"content-type": audio["content_type"] or ""})
+            )
+        result = await run_verification(**params, customer_audio_file=audio_file, on_progress=on_progress, on_row=on_row)
+        await asyncio.to_thread(
+            update_job, job_id,
+            status="completed", stage="completed", result=json.dumps(result), finished=time.time()
+        )
+        finished = True
+        logger.info(f"Verification job {job_id} completed")
+    except VerificationError as e:
+        await asyncio.to_thread(update_job, job_id, status="failed", stage="failed", error=str(e), finished=time.time())
+        finished = True
+    except Exception as e:
+        logger.error(f"Verification job {job_id} failed: {str(e)}", exc_info=True)
+        await asyncio.to_thread(
+            update_job, job_id,
+            status="failed", stage="failed", error=f"An unexpected error occurred: {str(e)}", finished=time.time()
+        )
+        finished = True
+    finally:
+        heartbeat_task.cancel()
+        notify_job(job_id)
+        trace_id_var.reset(trace_token)
+        if audio_file:
+            audio_file.file.close()
+        # A cancelled job is requeued on the next start and still needs its upload
+        if audio and finished:
+            try:
+                os.remove(audio["path"])
+            except OSError:
+                pass
+
+async def job_worker(worker_id):
+    """
+    Take queued jobs one at a time until cancelled
+    """
+    global last_job_prune, last_job_lease_check
+    while True:
+        job_available.clear()
+        try:
+            job = await asyncio.to_thread(claim_next_job)
+        except sqlite3.Error as e:
+            logger.error(f"Job worker {worker_id} could not claim a job: {str(e)}")
+            job = None
+        if job is not None:
+            await execute_job(job)
+            continue
+        
+        if time.time() - last_job_prune > 3600:
+            last_job_prune = time.time()
+            await asyncio.to_thread(prune_jobs)
+        if WEB_CONCURRENCY > 1 and time.time() - last_job_lease_check > JOB_LEASE_SECONDS / 2:
+            last_job_lease_check = time.time()
+            await asyncio.to_thread(requeue_stale_jobs, JOB_LEASE_SECONDS)
+        try:
+            await asyncio.wait_for(job_available.wait(), JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+# Batch verification. Orders are fetched ahead through the order cache and
+# verified with bounded parallelism, spaced out to stay under the OpenAI
+# rate limits.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "8"))
+BATCH_MAX_PER_MINUTE = float(os.getenv("BATCH_MAX_PER_MINUTE", "60"))
+BATCH_MAX_ORDERS = int(os.getenv("BATCH_MAX_ORDERS", "500"))
+
+class BatchOrder(BaseModel):
+    order_id: str
+    customer_chat_text: str = ""
+
+# Each order is checked against the customer's own words, so an order ID alone cannot be verified
+BATCH_MISSING_CHAT_ERROR = (
+    "Each order needs customer communication to verify against: send "
+    '{"orders": [{"order_id": ..., "customer_chat_text": ...}]} or a CSV with a chat_text column.'
+)
+
+class BatchRequest(BaseModel):
+    order_ids: List[str] = []
+    orders: List[BatchOrder] = []
+    bypass_cache: bool = False
+
+class RateThrottle:
+    """
+    Space out operations to at most `per_minute` starts per minute, and hold
+    them back while OpenAI has asked us to slow down
+    """
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute if per_minute > 0 else 0
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            cooldown = openai_cooldown_until() - time.time()
+            start = max(now, self.next_start, now + cooldown)
+            self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+def parse_batch_csv(text: str):
+    """
+    Read orders from CSV text with an order ID column and an optional chat text column
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    orders = []
+    for row in reader:
+        row = {(key or "").strip().lower().replace(" ", "_"): (value or "").strip() for key, value in row.items()}
+        order_id = row.get("order_id") or row.get("shopify_order_id")
+        if not order_id:
+            continue
+        orders.append(BatchOrder(
+            order_id=order_id,
+            customer_chat_text=row.get("customer_chat_text") or row.get("chat_text", "")
+        ))
+    return orders
+
+async def run_batch(orders, bypass_cache=False):
+    """
+    Verify a list of orders and yield one NDJSON line per order as it finishes,
+    followed by a summary line with the throughput
+    """
+    fetch_semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    verify_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    throttle = RateThrottle(BATCH_MAX_PER_MINUTE)
+    batch_start = time.perf_counter()
+
+    async def verify(order):
+        start = time.perf_counter()
+        if not order.customer_chat_text.strip():
+            # Nothing to check the order against; do not download it for nothing
+            return {"order_id": order.order_id, "status": "failed", "error": BATCH_MISSING_CHAT_ERROR, "seconds": 0.0}
+        openai_priority_var.set(PRIORITY_BATCH)
+        # Warm the order cache so the verification itself does not wait on Shopify
+        async with fetch_semaphore:
+            try:
+                await get_shopify_order_data(order.order_id)
+            except Exception as e:
+                # Failures are not cached; verifying anyway would download the order a second time
+                VERIFICATION_ERRORS.labels(STAGE_METRIC_NAMES["shopify"]).inc()
+                logger.error(f"Error fetching Shopify order: {str(e)}")
+                return {
+                    "order_id": order.order_id, "status": "failed",
+                    "error": f"Error fetching Shopify order: {str(e)}",
+                    "seconds": round(time.perf_counter() - start, 3)
+                }
+        async with verify_semaphore:
+            await throttle.wait()
+            try:
+                context = await run_verification(
+                    "shopify", "", order.order_id, order.customer_chat_text, None, bypass_cache=bypass_cache
+                )
+                line = {
+                    "order_id": order.order_id, "status": "completed",
+                    "result": context["result"], "report": context["report"]
+                }
+            except VerificationError as e:
+                line = {"order_id": order.order_id, "status": "failed", "error": str(e)}
+        line["seconds"] = round(time.perf_counter() - start, 3)
+        return line
+
+    tasks = [asyncio.create_task(verify(order)) for order in orders]
+    completed = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            if line["status"] == "completed":
+                completed += 1
+            else:
+                failed += 1
+            yield json.dumps(line) + "\n"
+    finally:
+        # Stop outstanding verifications if the client went away
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    elapsed = time.perf_counter() - batch_start
+    summary = {
+        "orders": len(orders),
+        "completed": completed,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 3),
+        "orders_per_minute": round(len(orders) / elapsed * 60, 2) if elapsed else 0,
+    }
+    logger.info(f"Batch verification finished: {summary}")
+    yield json.dumps({"summary": summary}) + "\n"
+
+def batch_response(orders, bypass_cache=False):
+    if not orders:
+        raise HTTPException(status_code=400, detail="No order IDs provided")
+    if len(orders) > BATCH_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Batches are limited to {BATCH_MAX_ORDERS} orders")
+    missing = [order.order_id for order in orders if not order.customer_chat_text.strip()]
+    if missing:
+        # Reject before any order is fetched from Shopify
+        shown = ", ".join(missing[:10]) + (f" and {len(missing) - 10} more" if len(missing) > 10 else "")
+        raise HTTPException(status_code=400, detail=f"{BATCH_MISSING_CHAT_ERROR} Orders without it: {shown}")
+    logger.info(f"Starting batch verification of {len(orders)} orders")
+    return StreamingResponse(run_batch(orders, bypass_cache), media_type="application/x-ndjson")
+
+@app.post("/batch")
+async def submit_batch(batch: BatchRequest):
+    """
+    Verify many Shopify orders, streaming NDJSON results as each finishes
+    """
+    orders = [BatchOrder(order_id=order_id) for order_id in batch.order_ids] + batch.orders
+    return batch_response(orders, batch.bypass_cache)
+
+@app.post("/batch/csv")
+async def submit_batch_csv(orders_file: UploadFile = File(...), bypass_cache: bool = Form(False)):
+    """
+    Verify the orders listed in a CSV file (order_id, chat_text columns)
+    """
+    text = (await orders_file.read()).decode("utf-8-sig", "replace")
+    return batch_response(parse_batch_csv(text), bypass_cache)
+
+@app.post("/submit", response_class=HTMLResponse)
+async def handle_form(
+    request: Request,
+    order_source: str = Form(...),  # Required field - "shopify" or "manual"
+    final_order: str = Form(""),  # Optional when using Shopify
+    shopify_order_id: str = Form(""),  # Optional when using manual input
+    customer_chat_text: str = Form(""),
+    customer_audio_file: UploadFile = File(None),
+    bypass_cache: bool = Form(False)
+):
+    logger.info("POST /submit - Form submission received")
+    logger.info(f"Order source: {order_source}")
+    logger.info(f"Final order provided: {'Yes' if final_order else 'No'}")
+    logger.info(f"Shopify order ID provided: {'Yes' if shopify_order_id else 'No'}")
+    logger.info(f"Customer chat text provided: {'Yes' if customer_chat_text else 'No'}")
+    logger.info(f"Customer audio file provided: {'Yes' if customer_audio_file else 'No'}")
+    
+    try:
+        context = await run_verification(
+            order_source, final_order, shopify_order_id, customer_chat_text, customer_audio_file,
+            bypass_cache=bypass_cache
+        )
+    except VerificationError as e:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": str(e)
+        })
+
+    logger.info("Rendering response template...")
+    with observe_stage("render"):
+        response = templates.TemplateResponse("index.html", {"request": request, **context})
+    return response
+
+@app.post("/jobs")
+async def submit_job(
+    order_source: str = Form(...),  # Required field - "shopify" or "manual"
+    final_order: str = Form(""),  # Optional when using Shopify
+    shopify_order_id: str = Form(""),  # Optional when using manual input
+    customer_chat_text: str = Form(""),
+    customer_audio_file: UploadFile = File(None),
+    bypass_cache: bool = Form(False)
+):
+    """
+    Queue a verification and return its job ID right away
+    """
+    job_id = uuid.uuid4().hex
+    params = {
+        "order_source": order_source,
+        "final_order": final_order,
+        "shopify_order_id": shopify_order_id,
+        "customer_chat_text": customer_chat_text,
+        "bypass_cache": bypass_cache,
+        "trace_id": trace_id_var.get(),
+    }
+    if customer_audio_file and customer_audio_file.size:
+        # Keep the upload on disk until a worker picks the job up
+        os.makedirs(JOBS_UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(JOBS_UPLOAD_DIR, job_id)
+        await asyncio.to_thread(copy_upload, customer_audio_file.file, path)
+        params["audio"] = {
+            "path": path,
+            "size": customer_audio_file.size,
+            "filename": customer_audio_file.filename,
+            "content_type": customer_audio_file.content_type,
+        }
+    
+    await asyncio.to_thread(insert_job, job_id, params)
+    job_available.set()
+    logger.info(f"POST /jobs - Queued verification job {job_id}")
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.get("/jobs/stats")
+async def get_job_stats():
+    """
+    Queue depth and wait/run time metrics for verification jobs
+    """
+    return JSONResponse(content=await asyncio.to_thread(job_stats))
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Status, progress stage and result of a verification job
+    """
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JSONResponse(content=job_to_dict(job))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream a job's progress as server-sent events until it finishes
+    """
+    if await asyncio.to_thread(get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        last = None
+        rows_sent = 0
+        listener = asyncio.Event()
+        job_listeners.setdefault(job_id, []).append(listener)
+        try:
+            while True:
+                listener.clear()
+                job = await asyncio.to_thread(get_job, job_id)
+                rows = json.loads(job["result_rows"]) if job["result_rows"] else []
+                for row in rows[rows_sent:]:
+                    yield f"event: row\ndata: {json.dumps(row)}\n\n"
+                rows_sent = max(rows_sent, len(rows))
+                state = (job["status"], job["stage"])
+                if state != last:
+                    last = state
+                    payload = {"status": job["status"], "stage": job["stage"], "error": job["error"]}
+                    yield f"event: progress\ndata: {json.dumps(payload)}\n\n"
+                if job["status"] in ["completed", "failed"]:
+                    return
+                # Woken straight away by changes in this process; the timeout
+                # picks up jobs run elsewhere
+                try:
+                    await asyncio.wait_for(listener.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            job_listeners[job_id].remove(listener)
+            if not job_listeners[job_id]:
+                del job_listeners[job_id]
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/report")
+async def get_job_report(job_id: str):
+    """
+    Structured verification report of a finished job
+    """
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=422, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {job['status']}")
+    result = json.loads(job["result"])
+    # Jobs finished before reports were stored only have the raw text
+    report = result.get("report") or parse_verification_result(result["result"]).model_dump(mode="json")
+    return JSONResponse(content={
+        "job_id": job_id,
+        "result_cached": result.get("result_cached", False),
+        **report,
     })
 
+@app.get("/jobs/{job_id}/view", response_class=HTMLResponse)
+async def view_job(request: Request, job_id: str):
+    """
+    Render a finished job's result in the main page
+    """
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": f"Verification job {job_id} not found."
+        }, status_code=404)
+    if job["status"] == "failed":
+        return templates.TemplateResponse("index.html", {"request": request, "error": job["error"]})
+    if job["status"] != "completed":
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": "This verification is still running. Please refresh the page in a moment."
+        })
+    with observe_stage("render"):
+        response = templates.TemplateResponse("index.html", {"request": request, **json.loads(job["result"])})
+    return response
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    logger.warning(f"Rejected oversized upload to {request.url.path}")
+    return templates.TemplateResponse("index.html", {
+        "request": request,
+        "error": f"Error processing customer audio file: {exc.detail}"
+    }, status_code=413)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Global exception handler caught: {str(exc)}", exc_info=True)
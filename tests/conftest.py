@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+# Keep test runs from writing the application's log file
+os.environ.setdefault("LOG_FILE", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+@pytest.fixture
+def load_fixture():
+    def load(name):
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            return json.load(f) if name.endswith(".json") else f.read()
+    return load
+
+@pytest.fixture
+def mock_http(monkeypatch):
+    """
+    Route the app's outbound requests to an in-process stub: call with a
+    handler that takes an httpx.Request and returns an httpx.Response
+    """
+    import main
+
+    def install(handler):
+        monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return install
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    """
+    An empty in-memory state store and no OpenAI back-off carried over from other tests
+    """
+    import main
+
+    monkeypatch.setattr(main, "state_store", main.MemoryStateStore())
+    monkeypatch.setattr(main, "openai_cooldown", {"until": 0.0, "checked": float("-inf")})
+    return main.state_store
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import main
+
+RUN_SECONDS = 0.3  # how long the fake assistant takes to answer
+OLD_POLL_INTERVAL = 2.0  # the fixed loop this replaced
+ANSWER = "VERIFICATION RESULTS:\nShape: Match (Rectangle)"
+
+@pytest.fixture
+def fake_assistants(monkeypatch, mock_http, fresh_state):
+    """
+    A local Assistants API whose runs complete RUN_SECONDS after creation,
+    counting the requests made to it
+    """
+    run = {"id": "run_1", "thread_id": "thread_1", "status": "queued"}
+    message = {"role": "assistant", "content": [{"type": "text", "text": {"value": ANSWER}}]}
+    state = {"created": None, "requests": 0}
+
+    async def events():
+        yield f"event: thread.run.created\ndata: {json.dumps(run)}\n\n".encode()
+        await asyncio.sleep(RUN_SECONDS)
+        yield f"event: thread.message.completed\ndata: {json.dumps(message)}\n\n".encode()
+        completed = {**run, "status": "completed", "usage": {"prompt_tokens": 200, "completion_tokens": 40}}
+        yield f"event: thread.run.completed\ndata: {json.dumps(completed)}\n\n".encode()
+        yield b"event: done\ndata: [DONE]\n\n"
+
+    def handler(request):
+        state["requests"] += 1
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/threads/runs"):
+            state["created"] = time.monotonic()
+            if json.loads(request.content).get("stream"):
+                return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+            return httpx.Response(200, json=run)
+        if path.endswith("/runs/run_1"):
+            done = time.monotonic() - state["created"] >= RUN_SECONDS
+            return httpx.Response(200, json={**run, "status": "completed" if done else "in_progress"})
+        if path.endswith("/messages"):
+            return httpx.Response(200, json={"data": [message]})
+        return httpx.Response(404)
+
+    mock_http(handler)
+    monkeypatch.setattr(main, "CUSTOM_ASSISTANT_ID", "asst_test")
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "assistant_threads", {})
+    monkeypatch.setitem(main.OUTBOUND_POLICIES["openai_assistants"], "scheduler", main.RateLimitScheduler("test", 600))
+    return state
+
+def time_to_result():
+    start = time.perf_counter()
+    assert asyncio.run(main.call_custom_gpt_assistant("Seat cushion", "navy please")) == ANSWER
+    return time.perf_counter() - start
+
+def test_streamed_run_beats_the_fixed_polling_loop(fake_assistants, monkeypatch):
+    # The loop this replaced: check every 2 seconds
+    monkeypatch.setattr(main, "ASSISTANT_STREAM_RUNS", False)
+    monkeypatch.setattr(main, "RUN_POLL_INITIAL_DELAY", OLD_POLL_INTERVAL)
+    monkeypatch.setattr(main, "RUN_POLL_MAX_DELAY", OLD_POLL_INTERVAL)
+    fixed_polling = time_to_result()
+    fixed_polling_requests = fake_assistants["requests"]
+
+    monkeypatch.setattr(main, "ASSISTANT_STREAM_RUNS", True)
+    fake_assistants["requests"] = 0
+    streamed = time_to_result()
+
+    assert fixed_polling >= OLD_POLL_INTERVAL
+    assert RUN_SECONDS <= streamed < RUN_SECONDS + 0.2
+    # One request instead of create, poll(s) and fetch messages
+    assert fake_assistants["requests"] == 1 < fixed_polling_requests
+
+def test_adaptive_polling_fallback_finishes_soon_after_the_run(fake_assistants, monkeypatch):
+    monkeypatch.setattr(main, "ASSISTANT_STREAM_RUNS", False)
+    adaptive_polling = time_to_result()
+    # Checks at once, after 0.25 s and after 0.75 s for a run that ends at 0.3 s
+    assert RUN_SECONDS <= adaptive_polling < 1.0
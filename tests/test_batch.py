@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+
+import main
+
+def test_batch_reports_a_failed_prefetch_without_fetching_again(monkeypatch):
+    calls = []
+
+    async def failing_fetch(order_id):
+        calls.append(order_id)
+        raise Exception(f"Order {order_id} not found")
+
+    async def unexpected_verification(*args, **kwargs):
+        raise AssertionError("run_verification should not run for an order that could not be fetched")
+
+    monkeypatch.setattr(main, "get_shopify_order_data", failing_fetch)
+    monkeypatch.setattr(main, "run_verification", unexpected_verification)
+
+    async def collect():
+        return [json.loads(line) async for line in main.run_batch([main.BatchOrder(order_id="404", customer_chat_text="2 navy seat cushions")])]
+
+    order_line, summary_line = asyncio.run(collect())
+    assert calls == ["404"]
+    assert order_line["status"] == "failed"
+    assert order_line["error"] == "Error fetching Shopify order: Order 404 not found"
+    assert summary_line["summary"]["failed"] == 1
+
+def test_id_only_batch_is_rejected_before_any_fetch(monkeypatch):
+    calls = []
+
+    async def recording_fetch(order_id):
+        calls.append(order_id)
+        return {}
+
+    monkeypatch.setattr(main, "get_shopify_order_data", recording_fetch)
+
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.post("/batch", json={"order_ids": ["1042", "1043"]})
+
+    response = asyncio.run(post())
+    assert response.status_code == 400
+    assert "customer_chat_text" in response.json()["detail"]
+    assert "1042, 1043" in response.json()["detail"]
+    assert calls == []
+
+def test_batch_order_without_chat_text_fails_without_fetching(monkeypatch):
+    calls = []
+
+    async def recording_fetch(order_id):
+        calls.append(order_id)
+        return {}
+
+    monkeypatch.setattr(main, "get_shopify_order_data", recording_fetch)
+
+    async def collect():
+        return [json.loads(line) async for line in main.run_batch([main.BatchOrder(order_id="1042")])]
+
+    order_line, summary_line = asyncio.run(collect())
+    assert calls == []
+    assert order_line == {
+        "order_id": "1042", "status": "failed", "error": main.BATCH_MISSING_CHAT_ERROR, "seconds": 0.0
+    }
+    assert summary_line["summary"]["failed"] == 1
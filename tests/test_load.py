@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+
+STUB_DELAY = 0.3  # seconds each stubbed Shopify or OpenAI call takes
+CONCURRENT_SUBMITS = 8
+
+VERIFICATION = """VERIFICATION RESULTS:
+Cushion Type: Match (Seat)
+Shape: Match (Rectangle)
+Dimensions: Match (20 x 20 x 3 in)
+Fabric: Match (Sunbrella Canvas)
+Color or Pattern: Match (Navy)
+Foam or Fill Type: Match (High Density Foam)
+Ties: Missing/Unclear (Not mentioned)
+Piping: Missing/Unclear (Not mentioned)
+Quantity per type/variant: Match (2)
+Special Requests: Missing/Unclear (None stated)"""
+
+@pytest.fixture
+def stub_servers(monkeypatch, mock_http, fresh_state, load_fixture, tmp_path):
+    """
+    Slow local stand-ins for the Shopify endpoint and the OpenAI chat API,
+    recording how many requests each has in flight at once
+    """
+    order = load_fixture("shopify_order_welt.json")
+    in_flight = {"shopify": 0, "openai": 0}
+    peak = {"shopify": 0, "openai": 0}
+
+    async def handler(request):
+        service = "shopify" if "/api/shopify/" in request.url.path else "openai"
+        in_flight[service] += 1
+        peak[service] = max(peak[service], in_flight[service])
+        try:
+            await asyncio.sleep(STUB_DELAY)
+        finally:
+            in_flight[service] -= 1
+        if service == "shopify":
+            return httpx.Response(200, json=order)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": VERIFICATION}}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 120},
+        })
+
+    mock_http(handler)
+    monkeypatch.setattr(main, "SHOPIFY_ORDER_ENDPOINT", "http://stub/api/shopify/")
+    monkeypatch.setattr(main, "GPT_ENDPOINT", "http://stub/v1/chat/completions")
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "USE_CUSTOM_GPT", False)
+    monkeypatch.setattr(main, "PRE_VERIFY", False)
+    monkeypatch.setattr(main, "shopify_order_cache", main.TTLCache(10, 300))
+    monkeypatch.setattr(main, "RESULT_CACHE_DB_PATH", str(tmp_path / "results.db"))
+    monkeypatch.setitem(main.OUTBOUND_POLICIES["openai_chat"], "scheduler", main.RateLimitScheduler("test", 600))
+    main.init_result_cache()
+    return peak
+
+def test_concurrent_submits_do_not_run_one_at_a_time(stub_servers):
+    async def submit(client, index):
+        response = await client.post("/submit", data={
+            "order_source": "shopify",
+            "shopify_order_id": f"{1000 + index}",
+            "customer_chat_text": f"Customer {index}: 2 navy seat cushions, 20 x 20 x 3",
+            "bypass_cache": "true",
+        })
+        assert response.status_code == 200
+        assert "Error calling GPT API" not in response.text
+        assert "Error fetching Shopify order" not in response.text
+        assert "High Density Foam" in response.text
+
+    async def load():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*[submit(client, index) for index in range(CONCURRENT_SUBMITS)])
+            return time.perf_counter() - start
+
+    elapsed = asyncio.run(load())
+    one_submit = 2 * STUB_DELAY  # a Shopify fetch, then a model call
+    # One at a time this would take CONCURRENT_SUBMITS * one_submit (4.8 s)
+    assert elapsed < 2 * one_submit
+    assert stub_servers == {"shopify": CONCURRENT_SUBMITS, "openai": CONCURRENT_SUBMITS}
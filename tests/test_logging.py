@@ -0,0 +1,53 @@
+import logging
+import time
+
+import main
+
+WRITE_SECONDS = 0.02  # a slow disk or log shipper
+LINES = 25
+
+class SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        time.sleep(WRITE_SECONDS)
+        self.messages.append(record.getMessage())
+
+def test_slow_log_writes_stay_off_the_request_path(monkeypatch):
+    # Before: the handler writes on the caller's thread
+    direct = SlowHandler()
+    direct_logger = logging.getLogger("test_logging.direct")
+    monkeypatch.setattr(direct_logger, "handlers", [direct])
+    monkeypatch.setattr(direct_logger, "propagate", False)
+    start = time.perf_counter()
+    for index in range(LINES):
+        direct_logger.warning(f"line {index}")
+    direct_seconds = time.perf_counter() - start
+
+    # After: records go through the queue to the listener thread
+    queued = SlowHandler()
+    monkeypatch.setattr(main.log_listener, "handlers", (queued,))
+    start = time.perf_counter()
+    for index in range(LINES):
+        main.logger.warning(f"line {index}")
+    queued_seconds = time.perf_counter() - start
+
+    assert direct_seconds >= LINES * WRITE_SECONDS
+    assert queued_seconds < direct_seconds / 10
+    deadline = time.monotonic() + 5
+    while len(queued.messages) < LINES and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queued.messages == [f"line {index}" for index in range(LINES)]
+
+def test_long_messages_are_truncated_before_they_are_written(monkeypatch):
+    written = SlowHandler()
+    monkeypatch.setattr(main.log_listener, "handlers", (written,))
+    main.logger.warning("Response body: " + "x" * 5000)
+    deadline = time.monotonic() + 5
+    while not written.messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    message = written.messages[0]
+    assert len(message) < main.LOG_MAX_MESSAGE_CHARS + 50
+    assert message.endswith(f"[{5015 - main.LOG_MAX_MESSAGE_CHARS} chars truncated]")
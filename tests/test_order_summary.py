@@ -0,0 +1,61 @@
+import main
+
+def test_summary_sorts_properties_into_attributes(load_fixture):
+    summary = main.summarize_order("5550001", load_fixture("shopify_order_welt.json"))
+    assert summary.name == "#1042"
+    (item,) = summary.line_items
+    assert item.quantity == 2
+    assert item.dimensions == ["20 x 20 x 3 in"]
+    assert item.fabric == ["Sunbrella Canvas Navy"]
+    assert item.piping == ["Welt Color: White"]
+    assert item.ties == ["Tie Length: 12 in"]
+    assert item.fill == ["High Density Foam"]
+    assert item.other == ["Quantities Note: Same as last year"]
+
+def test_welt_color_does_not_decide_the_fabric_color(load_fixture):
+    summary = main.summarize_order("5550001", load_fixture("shopify_order_welt.json"))
+    text = main.render_order_summary(summary)
+    assert main.order_field(text, "Fabric") == "Sunbrella Canvas Navy"
+    assert main.compare_color(main.order_field(text, "Fabric"), "navy please") == (
+        "Color or Pattern: Match (Order: Navy; Customer: Navy)"
+    )
+
+def test_rendered_summary_carries_the_order_but_not_hidden_properties(load_fixture):
+    order = load_fixture("shopify_order_welt.json")
+    text = main.render_order_summary(main.summarize_order("5550001", order))
+    assert text.startswith("Shopify Order #1042 (ID 5550001)")
+    assert "Quantity: 2" in text
+    assert "_hidden_id" not in text
+
+ORDER_FIXTURES = ["shopify_order_welt.json", "shopify_order_bench_single.json", "shopify_order_bench_multi.json"]
+
+def prompt_tokens(text):
+    # Counted the way the rate limit scheduler estimates them
+    return main.estimate_openai_tokens({"messages": [{"role": "user", "content": text}], "max_tokens": 0})
+
+def test_compact_payload_uses_a_fraction_of_the_prompt_tokens(load_fixture, monkeypatch):
+    before = after = 0
+    for name in ORDER_FIXTURES:
+        order = load_fixture(name)
+        order_id = str(order["order"]["id"])
+        monkeypatch.setattr(main, "COMPACT_ORDER_PAYLOAD", False)
+        full = main.format_shopify_order(order_id, order)
+        monkeypatch.setattr(main, "COMPACT_ORDER_PAYLOAD", True)
+        compact = main.format_shopify_order(order_id, order)
+        assert prompt_tokens(compact) < prompt_tokens(full) / 3, name
+        before += prompt_tokens(full)
+        after += prompt_tokens(compact)
+    assert after < before / 4
+
+def test_compact_payload_keeps_every_cushion_property_and_drops_the_rest(load_fixture):
+    order = load_fixture("shopify_order_bench_multi.json")
+    text = main.format_shopify_order("5550003", order)
+    for expected in [
+        "Item 1: Custom Seat Cushion - Square; Quantity: 4; SKU: SC-SQ",
+        "Item 2: Custom Back Cushion - Rectangle; Quantity: 2; SKU: BK-RECT",
+        "Order note: Please ship both together",
+        "20 x 20 x 2 in", "Dacron Wrapped Foam", "Back Ties", "Welt Color: White", "Fiber Fill",
+    ]:
+        assert expected in text
+    for dropped in ["pat.customer@example.com", "Harbor View", "shopify_payments", "203.0.113.24", "b-77"]:
+        assert dropped not in text
@@ -0,0 +1,160 @@
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+
+import main
+
+@pytest.fixture
+def outbound(monkeypatch, mock_http, fresh_state):
+    """
+    Fresh rate limit state and schedulers, so only the stub decides what happens
+    """
+    for endpoint in ["openai_chat", "openai_assistants"]:
+        monkeypatch.setitem(main.OUTBOUND_POLICIES[endpoint], "scheduler", main.RateLimitScheduler("test", 600))
+    return mock_http
+
+def test_retry_after_seconds_and_http_date():
+    assert main.retry_after_seconds(httpx.Response(429, headers={"retry-after": "2.5"})) == 2.5
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 < main.retry_after_seconds(httpx.Response(503, headers={"retry-after": date})) <= 30
+    assert main.retry_after_seconds(httpx.Response(503, headers={"retry-after": "soon"})) is None
+    assert main.retry_after_seconds(httpx.Response(503)) is None
+
+def test_retry_waits_for_retry_after(outbound):
+    responses = [
+        httpx.Response(503, headers={"retry-after": "0.2"}),
+        httpx.Response(200, json={"ok": True}),
+    ]
+    outbound(lambda request: responses.pop(0))
+
+    async def send():
+        start = time.perf_counter()
+        response = await main.send_request("shopify", "GET", "http://stub/api/shopify/1042")
+        return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(send())
+    assert response.status_code == 200
+    assert responses == []
+    assert 0.2 <= elapsed < 1
+
+def test_retry_after_past_the_limit_is_not_waited_out(outbound, monkeypatch):
+    monkeypatch.setattr(main, "OUTBOUND_RETRY_AFTER_MAX", 5)
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, headers={"retry-after": date})
+
+    outbound(handler)
+    response = asyncio.run(main.send_request("shopify", "GET", "http://stub/api/shopify/1042"))
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+def test_assistants_post_is_not_retried_on_503(outbound):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    outbound(handler)
+    response = asyncio.run(main.send_request("openai_assistants", "POST", "http://stub/v1/threads/runs", json={}))
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+def test_assistants_get_is_retried_on_503(outbound, monkeypatch):
+    monkeypatch.setattr(main, "OUTBOUND_BACKOFF_BASE", 0.01)
+    responses = [httpx.Response(503), httpx.Response(200, json={"status": "completed"})]
+    outbound(lambda request: responses.pop(0))
+    response = asyncio.run(main.send_request("openai_assistants", "GET", "http://stub/v1/threads/t/runs/r"))
+    assert response.status_code == 200
+
+def test_breaker_opens_then_lets_one_trial_through_and_closes(outbound, monkeypatch):
+    monkeypatch.setattr(main, "OUTBOUND_MAX_RETRIES", 0)
+    breaker = main.CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    monkeypatch.setitem(main.OUTBOUND_POLICIES["shopify"], "breaker", breaker)
+    statuses = [503, 503, 200]
+    outbound(lambda request: httpx.Response(statuses.pop(0)))
+    url = "http://stub/api/shopify/1042"
+
+    async def scenario():
+        for _ in range(2):
+            assert (await main.send_request("shopify", "GET", url)).status_code == 503
+        assert breaker.state == "open"
+        # Rejected without reaching the stub
+        with pytest.raises(main.CircuitOpenError):
+            await main.send_request("shopify", "GET", url)
+        assert statuses == [200]
+
+        await asyncio.sleep(0.1)
+        assert breaker.state == "half_open"
+        assert (await main.send_request("shopify", "GET", url)).status_code == 200
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+    assert breaker.times_opened == 1
+
+def test_half_open_breaker_lets_one_trial_through_at_a_time():
+    breaker = main.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow() is False
+    time.sleep(0.05)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
+
+def test_failed_half_open_trial_reopens_the_breaker():
+    breaker = main.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.05)
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1
+
+def test_hedged_request_returns_the_first_success(outbound):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            # The original request stalls
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"answer": "slow"})
+        return httpx.Response(200, json={"answer": "fast"})
+
+    outbound(handler)
+    hedge_wins = main.OUTBOUND_STATS["openai_chat"]["hedge_wins"]
+
+    async def send():
+        start = time.perf_counter()
+        response = await main.send_hedged_request(
+            "openai_chat", "POST", "http://stub/v1/chat/completions", 0.05, json={}
+        )
+        return response, time.perf_counter() - start
+
+    response, elapsed = asyncio.run(send())
+    assert response.json() == {"answer": "fast"}
+    assert elapsed < 0.5
+    assert len(calls) == 2
+    assert main.OUTBOUND_STATS["openai_chat"]["hedge_wins"] == hedge_wins + 1
+
+def test_hedged_request_without_a_stall_sends_once(outbound):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"answer": "only"})
+
+    outbound(handler)
+    response = asyncio.run(main.send_hedged_request(
+        "openai_chat", "POST", "http://stub/v1/chat/completions", 0.5, json={}
+    ))
+    assert response.json() == {"answer": "only"}
+    assert len(calls) == 1
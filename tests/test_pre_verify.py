@@ -0,0 +1,69 @@
+import main
+
+ORDER = "Item 1: Seat Cushion; Quantity: 1"
+
+def test_quantity_ignores_dimensions():
+    assert main.find_quantities("I ordered a 20 x 20 x 3 seat cushion") == []
+    assert main.compare_quantity(ORDER, "I ordered a 20 x 20 x 3 seat cushion") is None
+
+def test_quantity_ignores_numbers_with_units():
+    assert main.find_quantities("a 20 inch cushion") == []
+    assert main.find_quantities('a 20" cushion') == []
+    assert main.find_quantities("18 by 18 cushion") == []
+
+def test_quantity_next_to_dimensions():
+    assert main.find_quantities("I need 2 navy cushions, 20 x 20") == ["2"]
+    assert main.compare_quantity(ORDER, "two seat cushions please") == (
+        "Quantity per type/variant: Mismatch (Order: 1; Customer: 2)"
+    )
+
+def test_color_shade_and_its_parent_is_left_to_the_model():
+    assert main.compare_color("Fabric: Sunbrella Canvas Navy", "I want blue cushions") is None
+    assert main.compare_color("Fabric: Charcoal", "something grey") is None
+
+def test_color_sibling_shades_are_left_to_the_model():
+    assert main.compare_color("Fabric: Cream", "ivory please") is None
+
+def test_color_clear_match_and_mismatch():
+    assert main.compare_color("Fabric: Sunbrella Canvas Navy", "navy cushions") == (
+        "Color or Pattern: Match (Order: Navy; Customer: Navy)"
+    )
+    assert main.compare_color("Fabric: Sunbrella Canvas Navy", "red cushions") == (
+        "Color or Pattern: Mismatch (Order: Navy; Customer: Red)"
+    )
+
+def test_pre_verify_fixture_cases(load_fixture):
+    for case in load_fixture("pre_verify_cases.json"):
+        order = load_fixture(case["order_fixture"])
+        order_text = main.render_order_summary(main.summarize_order(str(order["order"]["id"]), order))
+        assert main.pre_verify(order_text, case["context"]) == case["expected"], case["name"]
+
+def test_pre_verify_leaves_multi_item_orders_and_empty_context_to_the_model():
+    two_items = "Item 1: Seat Cushion; Quantity: 1\nItem 2: Back Cushion; Quantity: 1"
+    assert main.pre_verify(two_items, "one seat cushion and one back cushion") == {}
+    assert main.pre_verify(ORDER, "   ") == {}
+
+def test_dimensions_are_compared_in_inches():
+    assert main.compare_dimensions("Dimensions: 50 x 50 cm", "about 19.75 x 19.75 inches") == (
+        "Dimensions: Match (Order: 19.69 x 19.69 in; Customer: 19.75 x 19.75 in)"
+    )
+
+def test_feature_settled_only_when_both_sides_say():
+    assert main.compare_feature("Ties", "ties", "Ties: No", "please add ties") == (
+        "Ties: Mismatch (Order: No ties; Customer: ties requested)"
+    )
+    assert main.compare_feature("Ties", "ties", "Ties: Yes", "navy cushions") is None
+
+def test_special_requests_are_left_to_the_model():
+    summary = "Shopify Order #1 (ID 1)\nItem 1: Seat Cushion; Quantity: 1"
+    for context in ["I'd like it a bit firmer and delivered before the 20th", "please ship to my office"]:
+        assert "Special Requests" not in main.pre_verify(summary, context)
+
+def test_quantity_ignores_order_numbers_and_years():
+    assert main.compare_quantity(ORDER, "calling about order 1042 seat cushions") is None
+    assert main.compare_quantity(ORDER, "about #12 seat cushions") is None
+    assert main.compare_quantity(ORDER, "order no. 7 patio cushions") is None
+    assert main.compare_quantity(ORDER, "bought these in 2019 patio cushions") is None
+    assert main.find_quantities("I need 120 seat cushions") == []
+    assert main.find_quantities("qty: 120") == ["120"]
+    assert main.find_quantities("order 1042: 2 seat cushions") == ["2"]
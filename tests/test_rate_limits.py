@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+
+def rate_limited_response(method, url):
+    return httpx.Response(429, text="Rate limit reached", request=httpx.Request(method, url))
+
+@pytest.mark.parametrize("stream_runs", [True, False])
+def test_assistant_run_429_is_raised_as_a_rate_limit(monkeypatch, stream_runs):
+    async def fake_send_request(endpoint, method, url, **kwargs):
+        return rate_limited_response(method, url)
+
+    monkeypatch.setattr(main, "CUSTOM_ASSISTANT_ID", "asst_test")
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "ASSISTANT_STREAM_RUNS", stream_runs)
+    monkeypatch.setattr(main, "send_request", fake_send_request)
+
+    with pytest.raises(httpx.HTTPStatusError) as raised:
+        asyncio.run(main.call_custom_gpt_assistant("Seat cushion", "navy please"))
+    assert main.is_openai_rate_limited(raised.value)
+
+def test_assistant_poll_429_is_raised_as_a_rate_limit(monkeypatch):
+    async def fake_send_request(endpoint, method, url, **kwargs):
+        return rate_limited_response(method, url)
+
+    monkeypatch.setattr(main, "send_request", fake_send_request)
+    with pytest.raises(httpx.HTTPStatusError) as raised:
+        asyncio.run(main.wait_for_run({}, "thread_1", "run_1"))
+    assert main.is_openai_rate_limited(raised.value)
+
+def test_rate_limited_assistant_verification_fails_instead_of_completing(monkeypatch, tmp_path):
+    async def rate_limited_assistant(final_order, customer_context=""):
+        raise httpx.HTTPStatusError(
+            "429", request=httpx.Request("POST", main.THREAD_RUNS_ENDPOINT),
+            response=rate_limited_response("POST", main.THREAD_RUNS_ENDPOINT)
+        )
+
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "USE_CUSTOM_GPT", True)
+    monkeypatch.setattr(main, "CUSTOM_ASSISTANT_ID", "asst_test")
+    monkeypatch.setattr(main, "RESULT_CACHE_DB_PATH", str(tmp_path / "results.db"))
+    monkeypatch.setattr(main, "call_custom_gpt_assistant", rate_limited_assistant)
+    main.init_result_cache()
+
+    with pytest.raises(main.VerificationError, match="rate limiting"):
+        asyncio.run(main.run_verification("manual", "Seat cushion", "", "navy please", None))
+
+def test_buckets_refill_up_to_one_minutes_limit():
+    scheduler = main.RateLimitScheduler("test", 60, 600)
+    scheduler.requests = scheduler.tokens = 0
+    # Pretend half a minute has passed
+    scheduler.updated -= 30
+    scheduler.refill()
+    assert scheduler.requests == pytest.approx(30, abs=0.1)
+    assert scheduler.tokens == pytest.approx(300, abs=1)
+    scheduler.updated -= 600
+    scheduler.refill()
+    assert (scheduler.requests, scheduler.tokens) == (60, 600)
+
+def test_requests_per_minute_limit(fresh_state):
+    scheduler = main.RateLimitScheduler("test", 60)
+
+    async def use_up_the_minute():
+        for _ in range(60):
+            await scheduler.acquire()
+
+    asyncio.run(use_up_the_minute())
+    assert scheduler.stats["throttled"] == 0
+    assert 0.9 < scheduler.seconds_until_fits(0) <= 1
+
+def test_tokens_per_minute_limit(fresh_state):
+    scheduler = main.RateLimitScheduler("test", 600, 1200)
+    asyncio.run(scheduler.acquire(1200))
+    assert 29.9 < scheduler.seconds_until_fits(600) <= 30
+    # A request larger than a minute's budget waits for a full bucket, not forever
+    scheduler.updated -= 60
+    scheduler.refill()
+    asyncio.run(scheduler.acquire(5000))
+    assert scheduler.stats["throttled"] == 0
+
+def test_waiting_requests_are_admitted_by_priority_then_age(fresh_state):
+    scheduler = main.RateLimitScheduler("test", 1200)
+    scheduler.requests = 0
+    admitted = []
+
+    async def request(name, priority):
+        main.openai_priority_var.set(priority)
+        await scheduler.acquire()
+        admitted.append(name)
+
+    async def run():
+        await asyncio.gather(
+            request("batch-1", main.PRIORITY_BATCH),
+            request("batch-2", main.PRIORITY_BATCH),
+            request("interactive-1", main.PRIORITY_INTERACTIVE),
+            request("interactive-2", main.PRIORITY_INTERACTIVE),
+        )
+
+    asyncio.run(run())
+    assert admitted == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+    assert scheduler.stats["throttled"] == 4
+
+def test_queue_timeout_fails_as_a_rate_limit(monkeypatch, fresh_state):
+    monkeypatch.setattr(main, "OPENAI_QUEUE_TIMEOUT", 0.05)
+    scheduler = main.RateLimitScheduler("test", 1)
+    scheduler.requests = 0
+
+    with pytest.raises(main.RateLimitQueueTimeout) as raised:
+        asyncio.run(scheduler.acquire())
+    assert main.is_openai_rate_limited(raised.value)
+    assert scheduler.stats["timeouts"] == 1
+
+def test_retry_after_holds_back_admission(fresh_state):
+    scheduler = main.RateLimitScheduler("test", 600)
+    main.note_openai_rate_limit(httpx.Response(429, headers={"retry-after": "0.3"}))
+    assert 0.2 < scheduler.seconds_until_fits(0) <= 0.3
+
+    async def timed_acquire():
+        start = time.perf_counter()
+        await scheduler.acquire()
+        return time.perf_counter() - start
+
+    assert asyncio.run(timed_acquire()) >= 0.25
+    assert scheduler.seconds_until_fits(0) == 0
+
+def test_scheduler_keeps_a_burst_under_a_rate_limited_stub(monkeypatch, mock_http, fresh_state):
+    # Stub enforcing 120 requests per minute with a bucket that refills
+    # continuously, with a little slack for timer granularity
+    bucket = {"level": 120.0, "updated": time.monotonic()}
+    statuses = []
+
+    def handler(request):
+        now = time.monotonic()
+        bucket["level"] = min(120.0, bucket["level"] + (now - bucket["updated"]) * 2)
+        bucket["updated"] = now
+        if bucket["level"] < 0.9:
+            statuses.append(429)
+        else:
+            bucket["level"] -= 1
+            statuses.append(200)
+        return httpx.Response(statuses[-1], json={"ok": True})
+
+    mock_http(handler)
+    scheduler = main.RateLimitScheduler("openai", 120)
+    monkeypatch.setitem(main.OUTBOUND_POLICIES["openai_chat"], "scheduler", scheduler)
+
+    async def burst():
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            main.send_request("openai_chat", "POST", "http://stub/v1/chat/completions", json={}) for _ in range(122)
+        ])
+        return responses, time.perf_counter() - start
+
+    responses, elapsed = asyncio.run(burst())
+    assert [response.status_code for response in responses] == [200] * 122
+    assert 429 not in statuses
+    # A minute's worth goes at once; the last two wait for the bucket to refill
+    assert 0.9 < elapsed < 2
+    assert scheduler.stats["throttled"] == 2
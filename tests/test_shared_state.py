@@ -0,0 +1,86 @@
+import sqlite3
+import time
+
+import httpx
+import pytest
+
+import main
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return main.SQLiteStateStore(str(tmp_path / "state.db"))
+
+def hold_write_lock(store):
+    """
+    Take the database's write lock from another connection, as a busy worker would
+    """
+    other = sqlite3.connect(store.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("INSERT INTO numbers (name, value) VALUES ('other_worker', 1)")
+    return other
+
+def test_cache_hit_does_not_write(sqlite_store):
+    cache = main.SQLiteTTLCache(sqlite_store, "shopify_order", 10, 300)
+    cache.put("1042", {"id": 1042})
+    changes = sqlite_store._connection.total_changes
+    for _ in range(5):
+        assert cache.get("1042") == {"id": 1042}
+    assert sqlite_store._connection.total_changes == changes
+    assert cache.stats["hits"] == 5
+
+def test_cache_hit_refreshes_a_stale_last_use(sqlite_store):
+    cache = main.SQLiteTTLCache(sqlite_store, "shopify_order", 10, 300)
+    cache.put("1042", {"id": 1042})
+    sqlite_store.execute("UPDATE cache SET last_used = last_used - 120")
+    assert cache.get("1042") == {"id": 1042}
+    last_used = sqlite_store.execute("SELECT last_used FROM cache WHERE key = '1042'").fetchone()[0]
+    assert time.time() - last_used < 5
+
+def test_reads_do_not_wait_for_another_workers_write(sqlite_store):
+    cache = main.SQLiteTTLCache(sqlite_store, "shopify_order", 10, 300)
+    cache.put("1042", {"id": 1042})
+    sqlite_store.execute("UPDATE cache SET last_used = last_used - 120")
+    other = hold_write_lock(sqlite_store)
+    try:
+        start = time.perf_counter()
+        assert cache.get("1042") == {"id": 1042}
+        assert sqlite_store.get("openai_cooldown_until") == 0.0
+        assert time.perf_counter() - start < main.STATE_DB_BUSY_TIMEOUT
+    finally:
+        other.rollback()
+        other.close()
+
+def test_cache_write_gives_up_after_the_busy_timeout(sqlite_store, monkeypatch):
+    monkeypatch.setattr(main, "STATE_DB_BUSY_TIMEOUT", 0.1)
+    cache = main.SQLiteTTLCache(sqlite_store, "shopify_order", 10, 300)
+    assert cache.get("1042") is None
+    other = hold_write_lock(sqlite_store)
+    try:
+        start = time.perf_counter()
+        cache.put("1042", {"id": 1042})
+        assert time.perf_counter() - start < 1
+    finally:
+        other.rollback()
+        other.close()
+    assert cache.get("1042") is None
+
+def test_openai_cooldown_is_read_at_most_once_a_second(fresh_state, monkeypatch):
+    reads = []
+    real_get = fresh_state.get
+
+    def counting_get(name, default=0.0):
+        reads.append(name)
+        return real_get(name, default)
+
+    monkeypatch.setattr(fresh_state, "get", counting_get)
+    scheduler = main.RateLimitScheduler("test", 600)
+    for _ in range(20):
+        assert scheduler.seconds_until_fits(0) == 0
+    assert reads == ["openai_cooldown_until"]
+
+def test_own_rate_limit_applies_before_the_next_read(fresh_state):
+    scheduler = main.RateLimitScheduler("test", 600)
+    assert scheduler.seconds_until_fits(0) == 0
+    main.note_openai_rate_limit(httpx.Response(429, headers={"retry-after": "5"}))
+    assert 4 < scheduler.seconds_until_fits(0) <= 5
+    assert fresh_state.get("openai_cooldown_until") > time.time()
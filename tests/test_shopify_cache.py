@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+
+@pytest.fixture(params=["memory", "sqlite"])
+def order_cache(request, monkeypatch, tmp_path):
+    """
+    An empty order cache and state store for each backend
+    """
+    if request.param == "sqlite":
+        store = main.SQLiteStateStore(str(tmp_path / "state.db"))
+        cache = main.SQLiteTTLCache(store, "shopify_order", 10, 300)
+    else:
+        store = main.MemoryStateStore()
+        cache = main.TTLCache(10, 300)
+    monkeypatch.setattr(main, "state_store", store)
+    monkeypatch.setattr(main, "shopify_order_cache", cache)
+    monkeypatch.setattr(main, "shopify_inflight", {})
+    return cache
+
+def update_marks():
+    rows = main.state_store.execute("SELECT name FROM numbers").fetchall() if isinstance(
+        main.state_store, main.SQLiteStateStore
+    ) else [(name,) for name in main.state_store._numbers]
+    return sorted(name for (name,) in rows if name.startswith("shopify_order_updated:"))
+
+def test_webhook_during_a_download_keeps_the_download_out_of_the_cache(order_cache, monkeypatch):
+    async def slow_download(order_id):
+        await asyncio.sleep(0.05)
+        return {"id": int(order_id), "note": "stale"}
+
+    monkeypatch.setattr(main, "download_shopify_order", slow_download)
+
+    async def scenario():
+        download = asyncio.create_task(main.get_shopify_order_data("1042"))
+        await asyncio.sleep(0.01)
+        main.update_cached_shopify_order({"id": 1042, "note": "fresh"})
+        assert (await download)["note"] == "stale"
+
+    asyncio.run(scenario())
+    assert order_cache.get("1042") == {"id": 1042, "note": "fresh"}
+
+def test_download_after_a_webhook_is_cached(order_cache, monkeypatch):
+    async def download(order_id):
+        return {"id": int(order_id)}
+
+    monkeypatch.setattr(main, "download_shopify_order", download)
+    main.invalidate_cached_shopify_order("1042")
+    time.sleep(0.01)
+    asyncio.run(main.get_shopify_order_data("1042"))
+    assert order_cache.get("1042") == {"id": 1042}
+
+def test_update_marks_are_dropped_once_no_download_needs_them(order_cache, monkeypatch):
+    monkeypatch.setattr(main, "SHOPIFY_UPDATE_MARK_SECONDS", 0.05)
+    for order_id in ["1", "2", "3"]:
+        main.invalidate_cached_shopify_order(order_id)
+    assert update_marks() == ["shopify_order_updated:1", "shopify_order_updated:2", "shopify_order_updated:3"]
+    time.sleep(0.06)
+    main.update_cached_shopify_order({"id": 4})
+    assert update_marks() == ["shopify_order_updated:4"]
+
+def test_download_outliving_the_marks_is_not_cached(order_cache, monkeypatch):
+    monkeypatch.setattr(main, "SHOPIFY_UPDATE_MARK_SECONDS", 0.02)
+
+    async def slow_download(order_id):
+        await asyncio.sleep(0.05)
+        return {"id": int(order_id)}
+
+    monkeypatch.setattr(main, "download_shopify_order", slow_download)
+    assert asyncio.run(main.get_shopify_order_data("1042")) == {"id": 1042}
+    assert order_cache.get("1042") is None
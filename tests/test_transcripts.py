@@ -0,0 +1,28 @@
+import main
+
+def test_stitch_drops_the_repeated_overlap():
+    parts = ["hello there how are you doing today", "are you doing today my friend"]
+    assert main.stitch_transcripts(parts) == "hello there how are you doing today my friend"
+
+def test_stitch_ignores_repeated_phrase_away_from_the_cut():
+    tail = "I would like two seat cushions of the same size as before and ties on the back corners please"
+    head = "corners please also of the same fabric as last time"
+    assert main.stitch_transcripts([tail, head]) == (
+        "I would like two seat cushions of the same size as before and ties on the back corners please "
+        "also of the same fabric as last time"
+    )
+
+def test_stitch_joins_chunks_without_a_shared_run():
+    assert main.stitch_transcripts(["alpha beta", "gamma delta"]) == "alpha beta gamma delta"
+
+def test_stitch_only_looks_within_the_overlap():
+    tail = "the blue one " + " ".join(f"word{i}" for i in range(20))
+    head = "the blue one and more"
+    assert main.stitch_transcripts([tail, head], overlap_words=6) == f"{tail} {head}"
+
+def test_plan_audio_chunks_cuts_at_silences_with_overlap():
+    assert main.plan_audio_chunks(1000, [280, 590, 870], 300, 2) == [(0.0, 282), (278, 582), (578, 872), (868, 1000)]
+
+def test_plan_audio_chunks_without_silences():
+    assert main.plan_audio_chunks(250, [], 300, 2) == [(0.0, 250)]
+    assert main.plan_audio_chunks(700, [], 300, 2) == [(0.0, 302.0), (298.0, 502.0), (498.0, 700)]
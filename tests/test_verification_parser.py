@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+MALFORMED_RESPONSE = """VERIFICATION RESULTS:
+Shape: Match (Rectangle)
+Dimensions - looks fine to me
+Fabric was Sunbrella Canvas Navy as requested"""
+
+@pytest.fixture
+def verification_env(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "USE_CUSTOM_GPT", False)
+    monkeypatch.setattr(main, "PRE_VERIFY", False)
+    monkeypatch.setattr(main, "RESULT_CACHE_DB_PATH", str(tmp_path / "results.db"))
+    main.init_result_cache()
+
+def test_failed_repair_keeps_model_text_and_is_not_cached(verification_env, monkeypatch):
+    async def fake_gpt(final_order, customer_context="", attributes=None, on_row=None):
+        return MALFORMED_RESPONSE
+
+    async def failing_request(*args, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(main, "call_standard_gpt", fake_gpt)
+    monkeypatch.setattr(main, "send_hedged_request", failing_request)
+
+    for _ in range(2):
+        context = asyncio.run(main.run_verification(
+            "manual", "Rectangle seat cushion, Sunbrella Canvas Navy", "", "Navy rectangle please", None
+        ))
+        assert context["result"] == MALFORMED_RESPONSE
+        assert context["result_cached"] is False
+        assert context["report"]["well_formed"] is False
+        assert context["report"]["repaired"] is False
+
+def test_parse_verification_row_tolerates_list_markers_and_case():
+    assert main.parse_verification_row("2. **Shape**: match (Rectangle)") == {
+        "attribute": "Shape", "status": "Match", "details": "Rectangle"
+    }
+    assert main.parse_verification_row("- Foam: Missing/Unclear - not stated") == {
+        "attribute": "Foam or Fill Type", "status": "Missing/Unclear", "details": "not stated"
+    }
+    assert main.parse_verification_row("Dimensions - looks fine to me") is None
+
+def test_parse_verification_result_reports_missing_attributes():
+    report = main.parse_verification_result(MALFORMED_RESPONSE)
+    assert [row.attribute for row in report.attributes] == ["Shape"]
+    assert "Dimensions" in report.malformed and "Fabric" in report.malformed
+    assert not report.well_formed
+
+def test_merge_uses_the_row_parser_and_keeps_unparsed_lines():
+    local = {"Shape": "Shape: Match (Order: Rectangle; Customer: Rectangle)"}
+    model_text = "VERIFICATION RESULTS:\n**Fabric**: mismatch (Order: Agora; Customer: Sunbrella)\nTies were not discussed"
+    assert main.merge_verification_results(local, model_text) == (
+        "VERIFICATION RESULTS:\n"
+        "Shape: Match (Order: Rectangle; Customer: Rectangle)\n"
+        "Fabric: Mismatch (Order: Agora; Customer: Sunbrella)\n"
+        "Ties were not discussed"
+    )
+
+def test_parse_verification_result_well_formed(load_fixture):
+    report = main.parse_verification_result(load_fixture("verification_response.txt"))
+    assert report.well_formed is True
+    assert report.malformed == []
+    assert [row.attribute for row in report.attributes] == main.VERIFICATION_ATTRIBUTES
+    assert report.attributes[2].status == "Mismatch"